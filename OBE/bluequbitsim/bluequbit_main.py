@@ -1,5 +1,9 @@
+import os
+import sys
 import bluequbit
-from qiskit import QuantumCircuit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tensor_networks"))
+from circuit_ir import CircuitIR
 
 
 bq = bluequbit.init("<API KEY>")
@@ -8,7 +12,7 @@ bq = bluequbit.init("<API KEY>")
 
 # Load your circuits from the QASM files
 print("Loading 30-qubit circuit from QASM file...")
-qc_30q = QuantumCircuit.from_qasm_file('./circuit_1_30q.qasm')
+qc_30q = CircuitIR.from_qasm('./circuit_1_30q.qasm').to_qiskit()
 print("30-qubit circuit loaded.\n")
 
 # Run the simulation
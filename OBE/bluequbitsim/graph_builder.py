@@ -1,39 +1,31 @@
+import os
 import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tensor_networks"))
 import networkx as nx
 import matplotlib.pyplot as plt
-from qiskit import QuantumCircuit
 from qiskit.visualization import plot_histogram
+from circuit_ir import CircuitIR
 
 def load_qasm_file(file_path):
     """
-    Loads a QASM file and returns a QuantumCircuit object.
+    Loads a QASM file into a `CircuitIR`.
     """
     try:
-        with open(file_path, 'r') as file:
-            qasm_str = file.read()
-        qc = QuantumCircuit.from_qasm_str(qasm_str)
-        return qc
+        return CircuitIR.from_qasm(file_path)
     except Exception as e:
         print(f"Error loading QASM file: {e}")
         sys.exit(1)
 
-def extract_cz_connections(qc):
+def extract_cz_connections(circuit):
     """
-    Extracts all CZ gate connections from the QuantumCircuit.
+    Extracts all CZ gate connections from the circuit.
     
     Returns:
         A list of tuples representing edges between qubits.
     """
-    cz_edges = []
-    for instruction, qargs, cargs in qc.data:
-        if instruction.name == 'cz':
-            # Qubit indices
-            qubit1 = qc.find_bit(qargs[0]).index
-            qubit2 = qc.find_bit(qargs[1]).index
-            # Ensure smaller index comes first for consistency
-            edge = tuple(sorted((qubit1, qubit2)))
-            cz_edges.append(edge)
-    return cz_edges
+    # Smaller index first for consistency.
+    return [tuple(edge) for edge in circuit.cz_edges().tolist()]
 
 def create_connectivity_graph(cz_edges, total_qubits):
     """
@@ -151,16 +143,16 @@ def main():
     qasm_file = "./circuit_3_60q.qasm"
     
     # Load the QASM file
-    qc = load_qasm_file(qasm_file)
+    circuit = load_qasm_file(qasm_file)
     
     # Extract CZ gate connections
-    cz_edges = extract_cz_connections(qc)
+    edges = extract_cz_connections(circuit)
     
     # Total number of qubits
-    total_qubits = qc.num_qubits
+    total_qubits = circuit.num_qubits
     
     # Create the connectivity graph
-    G = create_connectivity_graph(cz_edges, total_qubits)
+    G = create_connectivity_graph(edges, total_qubits)
     
     # Plot the graph
     plot_connectivity_graph(G)
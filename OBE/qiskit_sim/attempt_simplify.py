@@ -1,51 +1,39 @@
+import os
 import sys
-from qiskit import QuantumCircuit
 from qiskit_aer import AerSimulator
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tensor_networks"))
+from circuit_ir import CircuitIR
+
 def load_qasm(file_path):
     """
-    Loads a QASM file into a Qiskit QuantumCircuit.
+    Loads a QASM file into a `CircuitIR`.
     """
     try:
-        qc = QuantumCircuit.from_qasm_file(file_path)
+        circuit = CircuitIR.from_qasm(file_path)
         print("QASM file loaded successfully.\n")
-        return qc
+        return circuit
     except Exception as e:
         print(f"Error loading QASM file: {e}")
         sys.exit(1)
 
-def decompose_non_clifford_gates(original_qc):
+def decompose_non_clifford_gates(circuit):
     """
     Decomposes 'sx' and 'cz' gates into Clifford gate sequences.
     
     Args:
-        original_qc (QuantumCircuit): The original quantum circuit.
+        circuit (CircuitIR): The original circuit.
     
     Returns:
         QuantumCircuit: The decomposed quantum circuit with Clifford gates.
     """
-    decomposed_qc = QuantumCircuit(original_qc.num_qubits, original_qc.num_clbits)
-    
-    for instruction, qargs, cargs in original_qc.data:
-        if instruction.name == 'sx':
-            # Replace 'sx' with 'h', 's', 'h'
-            qubit = qargs[0]
-            decomposed_qc.h(qubit)
-            decomposed_qc.s(qubit)
-            decomposed_qc.h(qubit)
-        elif instruction.name == 'cz':
-            # Replace 'cz' with 'h', 'cx', 'h' on target qubit
-            control = qargs[0]
-            target = qargs[1]
-            decomposed_qc.h(target)
-            decomposed_qc.cx(control, target)
-            decomposed_qc.h(target)
-        else:
-            # Keep the gate as is
-            decomposed_qc.append(instruction, qargs, cargs)
+    # Replace 'sx' with 'h', 's', 'h'
+    decomposed = circuit.substitute("sx", [("h", (0,)), ("s", (0,)), ("h", (0,))])
+    # Replace 'cz' with 'h', 'cx', 'h' on target qubit; other gates are kept as is
+    decomposed = decomposed.substitute("cz", [("h", (1,)), ("cx", (0, 1)), ("h", (1,))])
     
     print("Non-Clifford gates ('sx' and 'cz') decomposed into Clifford gate sequences.\n")
-    return decomposed_qc
+    return decomposed.to_qiskit()
 
 def simulate_with_qiskit(decomposed_qc, shots=1):
     """
@@ -84,13 +72,13 @@ def display_results_qiskit(counts):
 
 def main(qasm_file_path):
     # Step 1: Load the QASM Circuit
-    qc = load_qasm(qasm_file_path)
+    circuit = load_qasm(qasm_file_path)
     print("--- Original Qiskit Circuit ---")
-    print(qc.draw())
+    print(circuit.to_qiskit().draw())
     print("\n")
     
     # Step 2: Decompose Non-Clifford Gates ('sx' and 'cz') into Clifford gates
-    decomposed_qc = decompose_non_clifford_gates(qc)
+    decomposed_qc = decompose_non_clifford_gates(circuit)
     print("--- Decomposed Circuit (Clifford Gates Only) ---")
     print(decomposed_qc.draw())
     print("\n")
@@ -1,8 +1,17 @@
+import os
+import sys
 import numpy as np
 import random
 from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, transpile
 from qiskit_aer import AerSimulator
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tensor_networks"))
+from circuit_ir import CircuitIR
+
+# Gate fusion before simulation: "none", "1q" (one-qubit runs) or "2q" (dense
+# two-qubit blocks, simulated as unitary gates).
+FUSION = "none"
+
 # # Set N and random seed
 # N = 59
 # random.seed(42)
@@ -43,7 +52,7 @@ from qiskit_aer import AerSimulator
 #         qc.cz(qr[l], qr[m])
 
 # qc.measure(qr, cr)
-qc = QuantumCircuit.from_qasm_file('./circuit_3_60q.qasm')
+qc = CircuitIR.from_qasm('./circuit_3_60q.qasm').to_qiskit(fusion=FUSION)
 
 # Execute the circuit on the qasm simulator
 simulator = AerSimulator(method='matrix_product_state')
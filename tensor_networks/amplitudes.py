@@ -0,0 +1,140 @@
+import numpy as np
+
+from peak_sampler import BATCH_IND, PRECISIONS
+from slicing import slice_tree
+from tree_store import search_tree
+
+
+def as_bit_array(bitstrings, num_qubits):
+    """
+    Converts bitstrings (a list of strings or an (n, num_qubits) array) into
+    an (n, num_qubits) uint8 bit array.
+    """
+    if isinstance(bitstrings, str):
+        bitstrings = [bitstrings]
+    if len(bitstrings) and isinstance(bitstrings[0], str):
+        joined = "".join(bitstrings).encode()
+        return (np.frombuffer(joined, dtype=np.uint8) - ord("0")).reshape(len(bitstrings), num_qubits)
+    return np.asarray(bitstrings, dtype=np.uint8).reshape(-1, num_qubits)
+
+
+def group_by_support(bits, reference, max_open=16):
+    """
+    Groups candidates so that each group differs from `reference` on a
+    small set of qubits. Candidates are visited in order of their support
+    (the qubits where they differ from the reference) and added to the
+    current group while the union of supports has at most `max_open` qubits.
+
+    Returns:
+        list: (support, rows) pairs, `support` a sorted tuple of qubits and
+            `rows` the indices of the candidates in the group.
+    """
+    differs = bits != reference[None, :]
+    supports = [tuple(np.flatnonzero(row)) for row in differs]
+    order = sorted(range(len(supports)), key=lambda r: (len(supports[r]), supports[r]))
+
+    groups = []
+    support, rows = set(), []
+    for r in order:
+        union = support.union(supports[r])
+        if rows and len(union) > max_open:
+            groups.append((tuple(sorted(support)), rows))
+            union, rows = set(supports[r]), []
+        support = union
+        rows.append(r)
+    if rows:
+        groups.append((tuple(sorted(support)), rows))
+    return groups
+
+
+def _open_amplitude_network(circ, reference, support, simplify_sequence, simplify_atol):
+    """
+    The circuit's state with every qubit outside `support` projected onto
+    its reference bit, simplified, with the `support` site indices open.
+    The simplification may move an overall scale into `tn.exponent`.
+    """
+    ket_ind_id = circ.psi.site_ind_id
+    tn = circ.psi.copy()
+    tn.isel_({ket_ind_id.format(q): int(reference[q]) for q in range(circ.N) if q not in support})
+    tn.full_simplify_(
+        simplify_sequence,
+        output_inds=[ket_ind_id.format(q) for q in support],
+        atol=simplify_atol,
+        equalize_norms=True,
+    )
+    return tn
+
+
+def batch_amplitudes(circ, bitstrings, optimize="auto-hq", simplify_sequence="ADCRS",
+                     simplify_atol=1e-6, reference=None, max_open=16, tree_store=None,
+                     max_memory=None, precision="double"):
+    """
+    Computes the amplitudes <x|psi> of many candidate bitstrings.
+
+    Candidates are grouped by the qubits where they differ from `reference`
+    (see `group_by_support`). In each group the agreeing qubits are fixed
+    before simplification, so the common part of the network is simplified
+    and contracted once, and every candidate of the group is selected by a
+    one-hot projector on the open qubits that carries the shared batch
+    index: one contraction tree per group, whatever the number of candidates.
+
+    Args:
+        circ (qtn.Circuit): The circuit.
+        bitstrings: List of bitstrings or (n, num_qubits) bit array.
+        optimize: cotengra optimizer or preset used for the contraction trees.
+        simplify_sequence (str): Local simplification sequence.
+        simplify_atol (float): Tolerance used by the simplifications.
+        reference: Bitstring the candidates are compared to, by default
+            the bitwise majority of the candidates.
+        max_open (int): Largest number of open qubits per group.
+        tree_store (TreeStore): Optional on-disk store of contraction trees.
+        max_memory (int): Optional bound in bytes on the largest
+            intermediate tensor (see `slice_tree`).
+        precision (str): "double" (complex128) or "single" (complex64)
+            contraction dtype; the results are returned as complex128.
+
+    Returns:
+        np.ndarray: Complex amplitudes, in the order of `bitstrings`.
+    """
+    bits = as_bit_array(bitstrings, circ.N)
+    if reference is None:
+        reference = (2 * bits.sum(axis=0) > bits.shape[0]).astype(np.uint8)
+    else:
+        reference = as_bit_array(reference, circ.N)[0]
+    ket_ind_id = circ.psi.site_ind_id
+
+    amplitudes = np.empty(bits.shape[0], dtype=np.complex128)
+    for support, rows in group_by_support(bits, reference, max_open=max_open):
+        tn = _open_amplitude_network(circ, reference, support, simplify_sequence, simplify_atol)
+        arrays = [np.asarray(t.data, dtype=PRECISIONS[precision]) for t in tn]
+        inputs = [tuple(t.inds) for t in tn]
+        size_dict = {ix: d for t in tn for ix, d in zip(t.inds, t.shape)}
+
+        output = ()
+        if support:
+            output = (BATCH_IND,)
+            size_dict[BATCH_IND] = len(rows)
+            dtype = np.result_type(*arrays)
+            for q in support:
+                ix = ket_ind_id.format(q)
+                projector = np.zeros((len(rows), 2), dtype=dtype)
+                projector[np.arange(len(rows)), bits[rows, q]] = 1
+                arrays.append(projector)
+                inputs.append((BATCH_IND, ix))
+                size_dict[ix] = 2
+
+        if tree_store is not None:
+            tree = tree_store.get_or_search(inputs, output, size_dict, optimize)
+        else:
+            tree = search_tree(inputs, output, size_dict, optimize)
+        tree, _ = slice_tree(tree, max_memory=max_memory, dtype=np.result_type(*arrays))
+        amplitudes[rows] = np.asarray(tree.contract(arrays)).reshape(-1) * 10.0 ** tn.exponent
+    return amplitudes
+
+
+def batch_probabilities(circ, bitstrings, **kwargs):
+    """
+    Output probabilities |<x|psi>|^2 of many candidate bitstrings, see
+    `batch_amplitudes`.
+    """
+    return np.abs(batch_amplitudes(circ, bitstrings, **kwargs)) ** 2
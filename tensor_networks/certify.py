@@ -0,0 +1,71 @@
+import itertools
+
+import numpy as np
+
+from amplitudes import as_bit_array, batch_probabilities
+
+
+def hamming_neighbours(bits, distance=1):
+    """
+    All bitstrings at exactly Hamming distance `distance` from `bits`.
+
+    Returns:
+        np.ndarray: (C(num_qubits, distance), num_qubits) uint8 bit array.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    flips = list(itertools.combinations(range(bits.shape[0]), distance))
+    neighbours = np.repeat(bits[None, :], len(flips), axis=0)
+    for col in range(distance):
+        qubits = [f[col] for f in flips]
+        neighbours[np.arange(len(flips)), qubits] ^= 1
+    return neighbours
+
+
+def certify_peak(circ, bitstring, max_distance=1, max_steps=None, **kwargs):
+    """
+    Hill-climbs from a decoded bitstring to a local maximum of the output
+    distribution.
+
+    Each step evaluates the probabilities of the current string and of all
+    its neighbours up to Hamming distance `max_distance` (1 or 2) in one
+    `batch_probabilities` call, and moves to the best neighbour if it is
+    more probable than the current string.
+
+    Args:
+        circ (qtn.Circuit): The circuit.
+        bitstring (str): Starting string, e.g. the majority vote.
+        max_distance (int): Largest Hamming distance of the neighbourhood.
+        max_steps (int): Optional bound on the number of moves.
+        kwargs: Passed on to `batch_probabilities`.
+
+    Returns:
+        dict: bitstring and probability of the final string, best_neighbour
+            and its probability, margin (probability minus the best
+            neighbour's), ratio (probability over the best neighbour's),
+            moves made and whether the final string is a local maximum.
+    """
+    current = as_bit_array(bitstring, circ.N)[0]
+    moves = 0
+    while True:
+        neighbours = np.concatenate([
+            hamming_neighbours(current, d) for d in range(1, max_distance + 1)
+        ])
+        candidates = np.concatenate([current[None, :], neighbours])
+        probs = batch_probabilities(circ, candidates, reference=current, **kwargs)
+        best = int(np.argmax(probs[1:])) + 1
+        improved = probs[best] > probs[0]
+        if not improved or (max_steps is not None and moves >= max_steps):
+            break
+        current = candidates[best]
+        moves += 1
+
+    return {
+        "bitstring": (current + ord("0")).tobytes().decode(),
+        "probability": float(probs[0]),
+        "best_neighbour": (candidates[best] + ord("0")).tobytes().decode(),
+        "neighbour_probability": float(probs[best]),
+        "margin": float(probs[0] - probs[best]),
+        "ratio": float(probs[0] / probs[best]) if probs[best] > 0 else float("inf"),
+        "moves": moves,
+        "local_maximum": not improved,
+    }
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zipfile
+
+import numpy as np
+
+from circuit_ir import CircuitIR
+from gate_fusion import FUSION_LEVELS, fuse_single_qubit, fuse_two_qubit, fused_to_quimb
+from qasm_parser import parse_qasm, to_quimb
+
+# Shared by every script in the project unless PEAK_CIRCUIT_CACHE points elsewhere.
+DEFAULT_DIRECTORY = os.environ.get(
+    "PEAK_CIRCUIT_CACHE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".circuit_cache"),
+)
+
+# Bumped whenever the layout of the cached files changes.
+FORMAT_VERSION = 2
+
+
+def cache_key(text, **options):
+    """SHA-256 of the QASM source and the preprocessing options."""
+    h = hashlib.sha256(text.encode())
+    h.update(json.dumps(dict(options, version=FORMAT_VERSION), sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def save_npz(path, arrays):
+    """
+    Writes arrays to an uncompressed `.npz` through a temporary file and a
+    rename, so readers only ever see a complete file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_npz_mmap(path):
+    """
+    Memory-maps every member of an uncompressed `.npz` in place, which
+    `np.load` only does for plain `.npy` files: each member's data starts
+    after its zip local header and its `.npy` header.
+
+    Returns:
+        dict: Read-only arrays by member name.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed.")
+            # Local file header: 30 fixed bytes, then the name and extra field.
+            f.seek(info.header_offset)
+            name_len, extra_len = struct.unpack("<HH", f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len(".npy")]
+            if 0 in shape:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(),
+                                         shape=shape, order="F" if fortran else "C")
+    return arrays
+
+
+def _encode_fused(fused):
+    """Columnar form of a fused circuit (see `fuse_single_qubit`)."""
+    kinds = list(dict.fromkeys(kind for kind, _, _ in fused["ops"]))
+    lookup = {kind: code for code, kind in enumerate(kinds)}
+    return {
+        "fused_kinds": np.array(kinds, dtype=str),
+        "fused_code": np.array([lookup[kind] for kind, _, _ in fused["ops"]], dtype=np.int8),
+        "fused_q0": np.array([a for _, a, _ in fused["ops"]], dtype=np.int64),
+        "fused_q1": np.array([b for _, _, b in fused["ops"]], dtype=np.int64),
+        "fused_unitaries": fused["unitaries"],
+        "fused_blocks": fused.get("blocks", np.zeros((0, 4, 4), dtype=np.complex128)),
+    }
+
+
+def _decode_fused(compiled):
+    kinds = compiled["fused_kinds"][compiled["fused_code"]].tolist()
+    return {
+        "num_qubits": int(compiled["num_qubits"][0]),
+        "ops": list(zip(kinds, compiled["fused_q0"].tolist(), compiled["fused_q1"].tolist())),
+        "unitaries": compiled["fused_unitaries"],
+        "blocks": compiled["fused_blocks"],
+    }
+
+
+def network_to_skeleton(tn):
+    """
+    Flattens a tensor network into arrays: every tensor's data concatenated,
+    with its offset, and its indices as labels into a table of index names.
+    """
+    labels = {}
+    for t in tn:
+        for ix in t.inds:
+            labels.setdefault(ix, len(labels))
+    sizes = {ix: d for t in tn for ix, d in zip(t.inds, t.shape)}
+    data = [np.asarray(t.data).ravel() for t in tn]
+    return {
+        "tn_ind_names": np.array(list(labels), dtype=str),
+        "tn_ind_sizes": np.array([sizes[ix] for ix in labels], dtype=np.int64),
+        "tn_ndim": np.array([t.ndim for t in tn], dtype=np.int64),
+        "tn_inds": np.array([labels[ix] for t in tn for ix in t.inds], dtype=np.int64),
+        "tn_offsets": np.cumsum([0] + [x.size for x in data]).astype(np.int64),
+        "tn_data": np.concatenate(data).astype(np.result_type(*data)),
+        "tn_exponent": np.array([float(tn.exponent)]),
+    }
+
+
+def network_from_skeleton(compiled):
+    """
+    Rebuilds the tensor network of `network_to_skeleton`; every tensor is a
+    view of the (memory-mapped) data.
+    """
+    import quimb.tensor as qtn
+
+    names = compiled["tn_ind_names"].tolist()
+    sizes = compiled["tn_ind_sizes"]
+    inds = compiled["tn_inds"]
+    offsets = compiled["tn_offsets"].tolist()
+    ends = np.cumsum(compiled["tn_ndim"]).tolist()
+    tensors = []
+    for i, end in enumerate(ends):
+        labels = inds[end - int(compiled["tn_ndim"][i]):end]
+        data = compiled["tn_data"][offsets[i]:offsets[i + 1]].reshape(sizes[labels])
+        tensors.append(qtn.Tensor(data, inds=[names[j] for j in labels]))
+    tn = qtn.TensorNetwork(tensors, virtual=True)
+    tn.exponent = float(compiled["tn_exponent"][0])
+    return tn
+
+
+def circuit_from_compiled(compiled, **circuit_opts):
+    """
+    Builds a `qtn.Circuit` from compiled arrays, from the fused circuit when
+    there is one.
+    """
+    if "fused_code" in compiled:
+        return fused_to_quimb(_decode_fused(compiled), **circuit_opts)
+    arrays = dict(compiled, num_qubits=int(compiled["num_qubits"][0]))
+    return to_quimb(arrays, **circuit_opts)
+
+
+class CircuitCache:
+    """
+    On-disk cache of preprocessed circuits.
+
+    A circuit is parsed and fused once, then saved as an uncompressed
+    `.npz` keyed by `cache_key` of the QASM source and the options: the
+    gate arrays of `parse_qasm`, the fused circuit and, only when asked for
+    (`load_network`), the simplified state network as flat arrays (see
+    `network_to_skeleton`). Later loads memory-map that file, so they cost
+    a file open instead of a parse and a fusion.
+
+    `load_sampler` keeps the rehearsed `PeakSampler` of a circuit the same
+    way, so a sampling run starts from a file open instead of a circuit
+    build, a per-group simplification and a tree search.
+
+    Args:
+        directory (str): Cache location, shared project-wide by default.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or DEFAULT_DIRECTORY
+        os.makedirs(self.directory, exist_ok=True)
+
+    def compile(self, qasm_file, fusion="none", simplify_sequence=None, simplify_atol=1e-6):
+        """
+        Returns the memory-mapped arrays of a preprocessed circuit, building
+        and saving them on a miss.
+
+        Args:
+            qasm_file (str): QASM file of the circuit.
+            fusion (str): Gate fusion, one of `FUSION_LEVELS`.
+            simplify_sequence (str): Simplification of the state network
+                to store, None (default) to store no network.
+            simplify_atol (float): Tolerance used by the simplifications.
+
+        Returns:
+            dict: Arrays of `parse_qasm` (op_names as an array), `fused_*`
+                arrays unless fusion is "none", and `tn_*` arrays unless
+                simplify_sequence is None.
+        """
+        if fusion not in FUSION_LEVELS:
+            raise ValueError(f"Unknown fusion {fusion!r}, expected one of {FUSION_LEVELS}.")
+        key = cache_key(self._read(qasm_file), fusion=fusion, simplify_sequence=simplify_sequence,
+                        simplify_atol=simplify_atol)
+        path = os.path.join(self.directory, f"{key}.npz")
+        if os.path.exists(path):
+            return load_npz_mmap(path)
+
+        parsed = parse_qasm(text=self._read(qasm_file))
+        compiled = {
+            "num_qubits": np.array([parsed["num_qubits"]], dtype=np.int64),
+            "op_names": np.array(parsed["op_names"], dtype=str),
+            "op_code": parsed["op_code"],
+            "q0": parsed["q0"],
+            "q1": parsed["q1"],
+            "params": parsed["params"],
+        }
+        if fusion == "1q":
+            compiled.update(_encode_fused(fuse_single_qubit(parsed)))
+        elif fusion == "2q":
+            compiled.update(_encode_fused(fuse_two_qubit(parsed)))
+        if simplify_sequence is not None:
+            circ = circuit_from_compiled(compiled)
+            output_inds = [circ.psi.site_ind_id.format(q) for q in range(circ.N)]
+            tn = circ.psi.full_simplify(simplify_sequence, output_inds=output_inds, atol=simplify_atol)
+            compiled.update(network_to_skeleton(tn))
+        save_npz(path, compiled)
+        return load_npz_mmap(path)
+
+    @staticmethod
+    def _read(qasm_file):
+        with open(qasm_file, "r") as f:
+            return f.read()
+
+    def load_ir(self, qasm_file):
+        """The unfused gate arrays of a cached circuit as a `CircuitIR` (memory-mapped)."""
+        compiled = self.compile(qasm_file)
+        return CircuitIR(compiled["num_qubits"][0], compiled["op_names"].tolist(), compiled["op_code"],
+                         compiled["q0"], compiled["q1"], compiled["params"])
+
+    def load_circuit(self, qasm_file, fusion="none", **circuit_opts):
+        """The `qtn.Circuit` of a cached circuit (see `circuit_from_compiled`)."""
+        return circuit_from_compiled(self.compile(qasm_file, fusion=fusion), **circuit_opts)
+
+    def load_network(self, qasm_file, fusion="none", simplify_sequence="ADCRS", simplify_atol=1e-6):
+        """The simplified state network of a cached circuit."""
+        compiled = self.compile(qasm_file, fusion=fusion, simplify_sequence=simplify_sequence,
+                                simplify_atol=simplify_atol)
+        return network_from_skeleton(compiled)
+
+    def load_sampler(self, qasm_file, fusion="none", optimize="auto-hq", seed=None, tree_store=None,
+                     **sampler_opts):
+        """
+        Returns the rehearsed `PeakSampler` of a circuit, rehearsing it and
+        saving it (see `PeakSampler.save`) on a miss.
+
+        The file is keyed by the QASM source, `fusion` and `sampler_opts`
+        (JSON-able `PeakSampler` settings such as group_size, batch_size,
+        simplify_sequence, max_memory or precision). The optimizer and
+        tree store only decide how the trees are found, so they are not
+        part of the key; the RNG is re-seeded with `seed`.
+        """
+        from peak_sampler import PeakSampler, circuit_topology_key
+
+        key = cache_key(self._read(qasm_file), artifact="sampler", fusion=fusion, **sampler_opts)
+        path = os.path.join(self.directory, f"{key}.pkl")
+        if os.path.exists(path):
+            sampler = PeakSampler.load(path)
+            sampler.rng = np.random.default_rng(seed)
+            return sampler
+        circ = self.load_circuit(qasm_file, fusion=fusion)
+        topology_key = circuit_topology_key(self.load_ir(qasm_file), fusion)
+        sampler = PeakSampler(circ, optimize=optimize, seed=seed, tree_store=tree_store,
+                              topology_key=topology_key, **sampler_opts)
+        sampler.save(path)
+        return sampler
+
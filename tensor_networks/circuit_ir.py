@@ -0,0 +1,201 @@
+import numpy as np
+
+import qasm_parser
+from gate_fusion import build_qiskit, build_quimb
+
+
+class CircuitIR:
+    """
+    Array-backed circuit shared by the OBE and tensor-network tools.
+
+    Holds the columns of `parse_qasm` (one entry per statement: op_code
+    into op_names, q0, q1 and params) without copying them, and answers the
+    queries the scripts used to loop over `qc.data` for with array
+    operations. Measurements keep their classical bit in q1, so two-qubit
+    gates are `is_two_qubit`, not `q1 >= 0`.
+
+    Args:
+        num_qubits (int): Size of the quantum register.
+        op_names (list): Gate name of every op code.
+        op_code, q0, q1, params (np.ndarray): Columns of `parse_qasm`.
+    """
+
+    __slots__ = ("num_qubits", "op_names", "op_code", "q0", "q1", "params", "_layers")
+
+    def __init__(self, num_qubits, op_names, op_code, q0, q1, params):
+        self.num_qubits = int(num_qubits)
+        self.op_names = list(op_names)
+        self.op_code = op_code
+        self.q0 = q0
+        self.q1 = q1
+        self.params = params
+        self._layers = None
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Wraps the arrays of `parse_qasm` (no copy)."""
+        return cls(arrays["num_qubits"], arrays["op_names"], arrays["op_code"],
+                   arrays["q0"], arrays["q1"], arrays["params"])
+
+    @classmethod
+    def from_qasm(cls, path=None, text=None):
+        """Parses a QASM file or source (see `parse_qasm`)."""
+        return cls.from_arrays(qasm_parser.parse_qasm(path=path, text=text))
+
+    def to_arrays(self):
+        """The arrays of `parse_qasm`, sharing this circuit's columns."""
+        return {
+            "num_qubits": self.num_qubits,
+            "op_names": self.op_names,
+            "op_code": self.op_code,
+            "q0": self.q0,
+            "q1": self.q1,
+            "params": self.params,
+        }
+
+    def __len__(self):
+        return len(self.op_code)
+
+    def __repr__(self):
+        return f"CircuitIR(num_qubits={self.num_qubits}, ops={len(self)})"
+
+    @property
+    def names(self):
+        """Gate name of every op."""
+        return qasm_parser.gate_names(self.to_arrays())
+
+    @property
+    def is_two_qubit(self):
+        """Mask of the two-qubit gates."""
+        return (self.q1 >= 0) & (self.names != "measure")
+
+    def counts(self):
+        """Number of ops of each gate name."""
+        counts = np.bincount(self.op_code, minlength=len(self.op_names))
+        return {name: int(c) for name, c in zip(self.op_names, counts) if c}
+
+    def gates_on(self, q):
+        """Indices of the ops acting on qubit `q`, in circuit order."""
+        return np.flatnonzero((self.q0 == q) | (self.is_two_qubit & (self.q1 == q)))
+
+    def cz_edges(self):
+        """Qubit pairs of all CZ gates, smaller index first, as an (m, 2) array."""
+        return qasm_parser.cz_edges(self.to_arrays())
+
+    def select(self, mask):
+        """The circuit restricted to the ops where `mask` is true."""
+        return CircuitIR.from_arrays(qasm_parser.select_ops(self.to_arrays(), mask))
+
+    def remap(self, exclude=(), max_qubits=None):
+        """
+        Drops the ops touching excluded qubits and renumbers the rest (see
+        `remap_qubits`).
+
+        Returns:
+            tuple: (remapped circuit, old qubit index of each new index).
+        """
+        arrays, order = qasm_parser.remap_qubits(self.to_arrays(), exclude=exclude, max_qubits=max_qubits)
+        return CircuitIR.from_arrays(arrays), order
+
+    def substitute(self, name, sequence):
+        """
+        Replaces every `name` gate by a sequence of parameter-free gates,
+        e.g. `substitute("sx", [("h", (0,)), ("s", (0,)), ("h", (0,))])`.
+
+        Args:
+            name (str): Gate to replace.
+            sequence (list): (gate, wires) pairs, where wires index the
+                qubits of the replaced gate (0 for q0, 1 for q1).
+
+        Returns:
+            CircuitIR: The new circuit.
+        """
+        hit = self.names == name
+        op_names = self.op_names + [g for g in dict.fromkeys(g for g, _ in sequence) if g not in self.op_names]
+        repeats = np.where(hit, len(sequence), 1)
+        op_code, q0, q1, params = (np.repeat(c, repeats, axis=0) for c in (self.op_code, self.q0, self.q1, self.params))
+        starts = (np.cumsum(repeats) - repeats)[hit]
+        wires = (self.q0[hit], self.q1[hit])
+        for j, (gate, qubits) in enumerate(sequence):
+            op_code[starts + j] = op_names.index(gate)
+            q0[starts + j] = wires[qubits[0]]
+            q1[starts + j] = wires[qubits[1]] if len(qubits) > 1 else -1
+            params[starts + j] = 0.0
+        return CircuitIR(self.num_qubits, op_names, op_code, q0, q1, params)
+
+    def layers(self):
+        """
+        ASAP layer of every op: one more than the latest layer on any of its
+        qubits. Ops of one layer act on disjoint qubits.
+
+        Found as a wavefront, one array step per layer: each qubit points
+        at its next unassigned op, and the ops every one of whose qubits
+        points at them form the next layer.
+
+        Returns:
+            np.ndarray: (num_ops,) layer indices.
+        """
+        if self._layers is None:
+            two = self.is_two_qubit
+            # Ops of each wire, in circuit order, as one flat array.
+            wires = np.concatenate([self.q0, self.q1[two]])
+            ops = np.concatenate([np.arange(len(self)), np.flatnonzero(two)])
+            order = np.lexsort((ops, wires))
+            wire_ops = ops[order]
+            head = np.searchsorted(wires[order], np.arange(self.num_qubits))
+            end = np.append(head[1:], len(wire_ops))
+            need = 1 + two.astype(np.int64)
+            layers = np.empty(len(self), dtype=np.int64)
+            layer = 0
+            while True:
+                live = np.flatnonzero(head < end)
+                if not live.size:
+                    break
+                front = wire_ops[head[live]]
+                ready = np.bincount(front, minlength=len(self))[front] == need[front]
+                layers[front[ready]] = layer
+                head[live[ready]] += 1
+                layer += 1
+            self._layers = layers
+        return self._layers
+
+    def depth(self):
+        """Number of layers."""
+        return int(self.layers().max()) + 1 if len(self) else 0
+
+    def light_cone(self, qubits):
+        """
+        Backward light cone of some qubits: the ops that can influence
+        their final state. Walks the layers backwards, one array operation
+        per layer.
+
+        Returns:
+            np.ndarray: (num_ops,) mask of the ops in the light cone.
+        """
+        layers = self.layers()
+        two = self.is_two_qubit
+        second = np.where(two, self.q1, self.q0)
+        active = np.zeros(self.num_qubits, dtype=bool)
+        active[list(qubits)] = True
+        mask = np.zeros(len(self), dtype=bool)
+        order = np.argsort(layers, kind="stable")
+        bounds = np.searchsorted(layers[order], np.arange(self.depth() + 1))
+        for layer in range(self.depth() - 1, -1, -1):
+            ops = order[bounds[layer]:bounds[layer + 1]]
+            hit = ops[active[self.q0[ops]] | active[second[ops]]]
+            mask[hit] = True
+            active[self.q0[hit]] = True
+            active[second[hit]] = True
+        return mask
+
+    def to_qasm(self):
+        """OpenQASM 2 source of the circuit."""
+        return qasm_parser.to_qasm(self.to_arrays())
+
+    def to_quimb(self, fusion="none", **circuit_opts):
+        """`qtn.Circuit` of the circuit after an optional fusion (see `build_quimb`)."""
+        return build_quimb(self.to_arrays(), fusion=fusion, **circuit_opts)
+
+    def to_qiskit(self, fusion="none"):
+        """qiskit `QuantumCircuit` of the circuit (see `build_qiskit`)."""
+        return build_qiskit(self.to_arrays(), fusion=fusion)
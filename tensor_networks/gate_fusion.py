@@ -0,0 +1,281 @@
+import numpy as np
+
+from qasm_parser import SX_MATRIX, gate_names, to_qiskit, to_quimb
+
+# Preprocessing stages accepted by `build_quimb`.
+FUSION_LEVELS = ("none", "1q", "2q")
+
+# 2x2 matrices of the parameter-free one-qubit gates.
+FIXED_GATES = {
+    "sx": SX_MATRIX,
+    "x": np.array([[0, 1], [1, 0]], dtype=np.complex128),
+    "y": np.array([[0, -1j], [1j, 0]], dtype=np.complex128),
+    "z": np.array([[1, 0], [0, -1]], dtype=np.complex128),
+    "h": np.array([[1, 1], [1, -1]], dtype=np.complex128) / np.sqrt(2),
+    "s": np.array([[1, 0], [0, 1j]], dtype=np.complex128),
+    "sdg": np.array([[1, 0], [0, -1j]], dtype=np.complex128),
+    "t": np.array([[1, 0], [0, np.exp(1j * np.pi / 4)]], dtype=np.complex128),
+    "id": np.eye(2, dtype=np.complex128),
+}
+
+# 4x4 matrices of the two-qubit gates, first qubit most significant.
+TWO_QUBIT_GATES = {
+    "cz": np.diag([1, 1, 1, -1]).astype(np.complex128),
+    "cx": np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]], dtype=np.complex128),
+    "swap": np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=np.complex128),
+}
+SWAP = TWO_QUBIT_GATES["swap"]
+
+
+def single_qubit_matrix(name, params):
+    """2x2 unitary of a one-qubit gate of the circuit arrays, from its params row."""
+    angle = params[0]
+    if name in ("u3", "u", "u2"):
+        theta, phi, lam = params if name != "u2" else (np.pi / 2, params[0], params[1])
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+        return np.array([[c, -np.exp(1j * lam) * s],
+                         [np.exp(1j * phi) * s, np.exp(1j * (phi + lam)) * c]])
+    if name == "rz":
+        return np.diag([np.exp(-0.5j * angle), np.exp(0.5j * angle)])
+    if name == "rx":
+        c, s = np.cos(angle / 2), np.sin(angle / 2)
+        return np.array([[c, -1j * s], [-1j * s, c]])
+    if name == "ry":
+        c, s = np.cos(angle / 2), np.sin(angle / 2)
+        return np.array([[c, -s], [s, c]], dtype=np.complex128)
+    if name in ("p", "u1"):
+        return np.diag([1.0, np.exp(1j * angle)])
+    if name in FIXED_GATES:
+        return FIXED_GATES[name]
+    raise ValueError(f"Gate {name} has no one-qubit matrix.")
+
+
+def fuse_single_qubit(arrays):
+    """
+    Multiplies every maximal run of one-qubit gates on a wire into a single
+    2x2 unitary.
+
+    Returns:
+        dict: The fused circuit: num_qubits, `ops`, a list of (kind, q0, q1)
+            with kind "unitary" (one-qubit, q1 = index into `unitaries`),
+            a two-qubit gate name such as "cz", or "measure" (q1 = classical
+            bit), and `unitaries`, an (m, 2, 2) complex array.
+    """
+    n = arrays["num_qubits"]
+    pending = [None] * n
+    ops = []
+    unitaries = []
+
+    def flush(q):
+        if pending[q] is not None:
+            ops.append(("unitary", q, len(unitaries)))
+            unitaries.append(pending[q])
+            pending[q] = None
+
+    names = gate_names(arrays)
+    for name, a, b, params in zip(names.tolist(), arrays["q0"].tolist(), arrays["q1"].tolist(),
+                                  arrays["params"].tolist()):
+        if name == "measure":
+            flush(a)
+            ops.append(("measure", a, b))
+        elif b >= 0:
+            flush(a)
+            flush(b)
+            ops.append((name, a, b))
+        else:
+            # Later gates act from the left.
+            g = single_qubit_matrix(name, params)
+            pending[a] = g if pending[a] is None else g @ pending[a]
+    for q in range(n):
+        flush(q)
+
+    return {
+        "num_qubits": n,
+        "ops": ops,
+        "unitaries": np.array(unitaries, dtype=np.complex128).reshape(-1, 2, 2),
+    }
+
+
+def fuse_two_qubit(arrays):
+    """
+    Fuses the circuit into dense two-qubit blocks: the one-qubit runs are
+    fused first (see `fuse_single_qubit`), then every entangler absorbs the
+    one-qubit unitaries on both of its wires, and consecutive gates on the
+    same qubit pair are merged into one block.
+
+    A one-qubit unitary goes into the block that last touched its wire, or
+    into the next block on that wire if there is none yet. Only wires
+    without any entangler (or after a measurement) keep one-qubit gates.
+
+    Returns:
+        dict: The fused circuit: num_qubits, `ops`, a list of (kind, q0, q1)
+            with kind "block" (the next entry of `blocks`, acting on
+            (q0, q1) with q0 the most significant factor), "unitary" or
+            "measure" as in `fuse_single_qubit`, plus `unitaries` and
+            `blocks`, an (k, 4, 4) complex array.
+    """
+    fused = fuse_single_qubit(arrays)
+    n = fused["num_qubits"]
+    # Unitary of each wire waiting for its first block, and the block that
+    # last touched each wire (still open to absorb later gates).
+    pending = [None] * n
+    last = [None] * n
+    ops = []
+    unitaries = []
+    blocks = []
+
+    def flush(q):
+        if pending[q] is not None:
+            ops.append(("unitary", q, len(unitaries)))
+            unitaries.append(pending[q])
+            pending[q] = None
+
+    for kind, a, b in fused["ops"]:
+        if kind == "unitary":
+            u = fused["unitaries"][b]
+            if last[a] is None:
+                pending[a] = u if pending[a] is None else u @ pending[a]
+                continue
+            k, first = last[a]
+            eye = np.eye(2)
+            blocks[k] = (np.kron(u, eye) if first else np.kron(eye, u)) @ blocks[k]
+        elif kind == "measure":
+            flush(a)
+            last[a] = None
+            ops.append(("measure", a, b))
+        else:
+            if kind not in TWO_QUBIT_GATES:
+                raise ValueError(f"Gate {kind} has no two-qubit matrix.")
+            g = TWO_QUBIT_GATES[kind]
+            if last[a] is not None and last[b] is not None and last[a][0] == last[b][0]:
+                # Same pair as the open block: merge, in the block's qubit order.
+                k, first = last[a]
+                blocks[k] = (g if first else SWAP @ g @ SWAP) @ blocks[k]
+                continue
+            pa = np.eye(2) if pending[a] is None else pending[a]
+            pb = np.eye(2) if pending[b] is None else pending[b]
+            pending[a] = pending[b] = None
+            last[a], last[b] = (len(blocks), True), (len(blocks), False)
+            ops.append(("block", a, b))
+            blocks.append(g @ np.kron(pa, pb))
+    for q in range(n):
+        flush(q)
+
+    return {
+        "num_qubits": n,
+        "ops": ops,
+        "unitaries": np.array(unitaries, dtype=np.complex128).reshape(-1, 2, 2),
+        "blocks": np.array(blocks, dtype=np.complex128).reshape(-1, 4, 4),
+    }
+
+
+def u3_angles(unitaries):
+    """
+    Euler angles (theta, phi, lambda) of (m, 2, 2) unitaries, such that each
+    equals u3(theta, phi, lambda) up to a global phase.
+
+    Returns:
+        np.ndarray: (m, 3) angles.
+    """
+    u = np.asarray(unitaries).reshape(-1, 2, 2)
+    cos, sin = np.abs(u[:, 0, 0]), np.abs(u[:, 1, 0])
+    theta = 2 * np.arctan2(sin, cos)
+    has_cos, has_sin = cos > 1e-12, sin > 1e-12
+    # The global phase comes from u[0, 0], or from -u[0, 1] (lambda = 0)
+    # when the cosine vanishes; phi = 0 when the sine vanishes.
+    alpha = np.where(has_cos, np.angle(u[:, 0, 0]), np.angle(-u[:, 0, 1]))
+    phi = np.where(has_sin, np.angle(u[:, 1, 0]) - alpha, 0.0)
+    lam = np.where(has_sin, np.angle(-u[:, 0, 1]), np.angle(u[:, 1, 1])) - alpha
+    lam = np.where(has_cos, lam, 0.0)
+    return np.stack([theta, phi, lam], axis=1)
+
+
+def fused_to_quimb(fused, **circuit_opts):
+    """
+    Builds a `qtn.Circuit` from a fused circuit, applying every fused
+    unitary and two-qubit block as a raw array (measurements dropped).
+    """
+    import quimb.tensor as qtn
+
+    circ = qtn.Circuit(fused["num_qubits"], **circuit_opts)
+    blocks = iter(fused.get("blocks", ()))
+    for kind, a, b in fused["ops"]:
+        if kind == "unitary":
+            circ.apply_gate(fused["unitaries"][b], a)
+        elif kind == "block":
+            circ.apply_gate(next(blocks), a, b)
+        elif kind != "measure":
+            circ.apply_gate(kind.upper(), a, b)
+    return circ
+
+
+def build_quimb(arrays, fusion="none", **circuit_opts):
+    """
+    Builds a `qtn.Circuit` from the circuit arrays after an optional fusion
+    stage: "none" keeps every gate, "1q" fuses the one-qubit runs and "2q"
+    fuses everything into two-qubit blocks.
+    """
+    if fusion == "none":
+        return to_quimb(arrays, **circuit_opts)
+    if fusion == "1q":
+        return fused_to_quimb(fuse_single_qubit(arrays), **circuit_opts)
+    if fusion == "2q":
+        return fused_to_quimb(fuse_two_qubit(arrays), **circuit_opts)
+    raise ValueError(f"Unknown fusion {fusion!r}, expected one of {FUSION_LEVELS}.")
+
+
+def build_qiskit(arrays, fusion="none"):
+    """Same as `build_quimb`, for a qiskit `QuantumCircuit`."""
+    if fusion == "none":
+        return to_qiskit(arrays)
+    if fusion == "1q":
+        return fused_to_qiskit(fuse_single_qubit(arrays))
+    if fusion == "2q":
+        return fused_to_qiskit(fuse_two_qubit(arrays))
+    raise ValueError(f"Unknown fusion {fusion!r}, expected one of {FUSION_LEVELS}.")
+
+
+def fused_to_qasm(fused):
+    """
+    Writes a one-qubit fused circuit as OpenQASM 2, one `u3` per fused
+    unitary. Two-qubit blocks have no QASM 2 form.
+    """
+    if len(fused.get("blocks", ())):
+        raise ValueError("Two-qubit blocks cannot be written as OpenQASM 2.")
+    n = fused["num_qubits"]
+    angles = u3_angles(fused["unitaries"]).tolist()
+    clbits = max([n] + [b + 1 for kind, _, b in fused["ops"] if kind == "measure"])
+    lines = ["OPENQASM 2.0;", 'include "qelib1.inc";', f"qreg q[{n}];", f"creg c[{clbits}];"]
+    for kind, a, b in fused["ops"]:
+        if kind == "unitary":
+            theta, phi, lam = angles[b]
+            lines.append(f"u3({theta!r},{phi!r},{lam!r}) q[{a}];")
+        elif kind == "measure":
+            lines.append(f"measure q[{a}] -> c[{b}];")
+        else:
+            lines.append(f"{kind} q[{a}],q[{b}];")
+    return "\n".join(lines) + "\n"
+
+
+def fused_to_qiskit(fused):
+    """
+    Builds a qiskit `QuantumCircuit` from a fused circuit, using `u` gates
+    and, for two-qubit blocks, `unitary` gates.
+    """
+    from qiskit import QuantumCircuit
+
+    n = fused["num_qubits"]
+    qc = QuantumCircuit(n, n)
+    angles = u3_angles(fused["unitaries"]).tolist()
+    blocks = iter(fused.get("blocks", ()))
+    for kind, a, b in fused["ops"]:
+        if kind == "unitary":
+            qc.u(*angles[b], a)
+        elif kind == "block":
+            # qiskit orders the qubits little-endian.
+            qc.unitary(next(blocks), [b, a])
+        elif kind == "measure":
+            qc.measure(a, b)
+        else:
+            getattr(qc, kind)(a, b)
+    return qc
@@ -0,0 +1,161 @@
+import numpy as np
+from scipy.stats import beta
+
+
+def bit_confidences(ones, num_samples, prior=1.0):
+    """
+    Posterior probability that each bit's majority is the right one.
+
+    Each bit is modelled as a coin with unknown P(bit = 1) = p and a
+    Beta(prior, prior) prior, so after `ones` ones in `num_samples` samples
+    the posterior is Beta(prior + ones, prior + zeros). The confidence of a
+    bit is the posterior mass on the side of 1/2 its majority points to.
+
+    Args:
+        ones (np.ndarray): Number of samples with each bit set.
+        num_samples (int): Total number of samples.
+        prior (float): Symmetric Beta prior parameter.
+
+    Returns:
+        np.ndarray: Per-bit confidence in [0.5, 1].
+    """
+    ones = np.asarray(ones, dtype=np.float64)
+    p_one = beta.sf(0.5, prior + ones, prior + num_samples - ones)
+    return np.maximum(p_one, 1.0 - p_one)
+
+
+def sequential_majority_decision(ones, num_samples, error_rate=1e-3, prior=1.0, min_samples=10):
+    """
+    Sequential stopping rule for bitwise majority-vote decoding.
+
+    Sampling can stop once every bit's majority is significant: each bit's
+    posterior error probability must be below `error_rate / num_bits`, so by
+    the union bound the whole decoded bitstring is wrong with probability
+    at most `error_rate`. No target bitstring is needed.
+
+    Args:
+        ones (np.ndarray): Number of samples with each bit set.
+        num_samples (int): Total number of samples.
+        error_rate (float): Allowed probability that any bit is wrong.
+        prior (float): Symmetric Beta prior parameter.
+        min_samples (int): Never stop before this many samples.
+
+    Returns:
+        tuple: (stop, bitstring, confidences) where `stop` tells whether the
+            decode is settled, `bitstring` is the current majority vote and
+            `confidences` the per-bit posterior confidence.
+    """
+    ones = np.asarray(ones)
+    confidences = bit_confidences(ones, num_samples, prior=prior)
+    bitstring = ((2 * ones > num_samples).astype(np.uint8) + ord("0")).tobytes().decode()
+    threshold = 1.0 - error_rate / len(ones)
+    stop = num_samples >= min_samples and bool(np.all(confidences >= threshold))
+    return stop, bitstring, confidences
+
+
+def unpack_samples(samples, num_qubits, packed=None):
+    """
+    Converts samples to an (n, num_qubits) uint8 bit array.
+
+    Accepts bit arrays of shape (num_qubits,) or (n, num_qubits), packed
+    integers (a Python int or a uint64 array of shape (n,)), or packed words
+    of shape (n, ceil(num_qubits / 64)). A packed sample holds
+    int(bitstring, 2) split big-endian into 64-bit words, so qubit 0 is its
+    most significant bit.
+
+    Bool arrays are bits and uint64 arrays are packed. Any other integer
+    array (or list) is taken as bits when its last dimension is num_qubits
+    and it only holds 0 and 1; pass `packed` to decide explicitly.
+    """
+    words = -(-num_qubits // 64)
+    if isinstance(samples, (int, np.integer)):
+        samples = np.array([samples], dtype=np.uint64)
+        packed = True
+    samples = np.asarray(samples)
+    if packed is None:
+        if samples.dtype == np.bool_:
+            packed = False
+        elif samples.dtype == np.uint64 or not np.issubdtype(samples.dtype, np.integer):
+            packed = True
+        else:
+            packed = not (samples.shape[-1] == num_qubits and bool(np.all((samples == 0) | (samples == 1))))
+    if not packed:
+        if samples.shape[-1] != num_qubits:
+            raise ValueError(f"Bit arrays need a last dimension of {num_qubits}, got shape {samples.shape}.")
+        return samples.astype(np.uint8, copy=False).reshape(-1, num_qubits)
+    # Big-endian words viewed as bytes unpack most significant bit first,
+    # one byte per bit; then drop the unused high bits of the first word.
+    samples = samples.astype(">u8").reshape(-1, words)
+    bits = np.unpackbits(samples.view(np.uint8), axis=1)
+    return bits[:, 64 * words - num_qubits:]
+
+
+class VoteAccumulator:
+    """
+    Incremental bitwise majority vote backed by NumPy counters.
+
+    Keeps the number of ones per bit and the running margin
+    (ones - zeros) per bit, and tracks the current decode so that it only
+    changes where a bit's majority flips.
+
+    Args:
+        num_qubits (int): Number of bits per sample.
+    """
+
+    def __init__(self, num_qubits):
+        self.num_qubits = num_qubits
+        self.num_samples = 0
+        self.ones = np.zeros(num_qubits, dtype=np.int64)
+        self.margin = np.zeros(num_qubits, dtype=np.int64)
+        self.decoded = np.zeros(num_qubits, dtype=np.uint8)
+        self.flipped = np.zeros(0, dtype=np.int64)
+        self._bitstring = "0" * num_qubits
+
+    def restore(self, ones, num_samples):
+        """
+        Resets the counts to saved per-bit one counts, e.g. from a checkpoint.
+        """
+        self.ones[:] = ones
+        self.num_samples = int(num_samples)
+        self.margin[:] = 2 * self.ones - self.num_samples
+        self.decoded = (self.margin > 0).astype(np.uint8)
+        self._bitstring = None
+
+    def add(self, samples, packed=None):
+        """
+        Ingests one sample or a batch (see `unpack_samples` for the formats
+        and `packed`).
+
+        Returns:
+            np.ndarray: Indices of the bits whose majority flipped.
+        """
+        bits = unpack_samples(samples, self.num_qubits, packed=packed)
+        ones = bits.sum(axis=0, dtype=np.int64)
+        self.ones += ones
+        self.margin += 2 * ones - bits.shape[0]
+        self.num_samples += bits.shape[0]
+
+        # Ties decode to '0', as the original majority vote did.
+        decoded = (self.margin > 0).astype(np.uint8)
+        self.flipped = np.flatnonzero(decoded != self.decoded)
+        if self.flipped.size:
+            self.decoded = decoded
+            self._bitstring = None
+        return self.flipped
+
+    @property
+    def bitstring(self):
+        """
+        The current majority-vote bitstring.
+        """
+        if self._bitstring is None:
+            self._bitstring = (self.decoded + ord("0")).tobytes().decode()
+        return self._bitstring
+
+    def decision(self, error_rate=1e-3, prior=1.0, min_samples=10):
+        """
+        Applies `sequential_majority_decision` to the current counts.
+        """
+        return sequential_majority_decision(
+            self.ones, self.num_samples, error_rate=error_rate, prior=prior, min_samples=min_samples
+        )
@@ -0,0 +1,791 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import autoray as ar
+import cotengra as ctg
+import quimb.tensor as qtn
+
+from slicing import slice_tree
+from tree_store import canonical_structure, hash_structure, search_tree, tree_from_entry, tree_to_entry
+
+# Name of the hyper index that carries the sample (batch) dimension.
+BATCH_IND = "__batch__"
+# Contraction dtypes of the precision options. Marginals are always
+# normalized in float64.
+PRECISIONS = {"double": np.complex128, "single": np.complex64}
+# Most aggressive simplification tried when a group's contraction is too large.
+FALLBACK_SEQUENCE = "ADCRS"
+
+logger = logging.getLogger(__name__)
+
+
+class ContractionTooLarge(MemoryError):
+    """A contraction's peak intermediate exceeds the configured memory limit."""
+
+
+def qubit_sampling_order(circ):
+    """
+    Orders the qubits by the position of their final gate, which is the
+    order in which gate-by-gate sampling finishes (and therefore samples) them.
+
+    Args:
+        circ (qtn.Circuit): The circuit to sample.
+
+    Returns:
+        list: Qubit indices in sampling order.
+    """
+    last_gate = [-1] * circ.N
+    for i, gate in enumerate(circ.gates):
+        for q in gate.qubits:
+            last_gate[q] = i
+    return sorted(range(circ.N), key=lambda q: (last_gate[q], q))
+
+
+def sampling_groups(circ, group_size):
+    """
+    Splits the sampling order into consecutive groups of `group_size` qubits.
+    """
+    order = qubit_sampling_order(circ)
+    return [tuple(order[i:i + group_size]) for i in range(0, len(order), group_size)]
+
+
+def circuit_topology_key(ir, fusion="none"):
+    """
+    SHA-256 of a `CircuitIR`'s gate names and qubits and of the fusion it
+    is built with, ignoring the gate parameters, so that parametric
+    variants of one circuit share a key. Fusion only depends on which gates
+    act where, so the fused circuits of variants share their structure too.
+    """
+    h = hashlib.sha256(f"{ir.num_qubits};{fusion};".encode())
+    h.update("\n".join(ir.names.tolist()).encode())
+    h.update(np.ascontiguousarray(ir.q0, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(ir.q1, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def build_marginal_network(circ, fixed, group, ket_ind_id, bra_ind_id="b{}",
+                           simplify_sequence="ADCRS", simplify_atol=1e-6):
+    """
+    Builds the simplified ket-bra network whose diagonal over `group` is the
+    marginal p(group, fixed). The fixed qubits are left open on both the ket
+    (`ket_ind_id`) and bra (`bra_ind_id`) sides so that projectors for any
+    number of samples can be attached after simplification.
+
+    Args:
+        circ (qtn.Circuit): The circuit to sample.
+        fixed (tuple): Qubits already sampled (conditioned on).
+        group (tuple): Qubits whose joint marginal is computed.
+        ket_ind_id (str): Format string of the circuit's ket site indices.
+        bra_ind_id (str): Format string used for the bra site indices.
+        simplify_sequence (str): Local simplification sequence, e.g. "ADCRS".
+        simplify_atol (float): Tolerance used by the simplifications.
+
+    Returns:
+        qtn.TensorNetwork: The simplified network.
+    """
+    ket = circ.get_psi_reverse_lightcone(tuple(fixed) + tuple(group))
+    bra = ket.H
+    # Give the bra its own bonds, then open the fixed qubits separately on
+    # each side. Traced qubits keep a shared site index and contract away,
+    # group qubits keep a shared site index that stays open (the diagonal).
+    bra.reindex_({ix: qtn.rand_uuid() for ix in bra.inner_inds()})
+    bra.reindex_({ket_ind_id.format(q): bra_ind_id.format(q) for q in fixed})
+    rho = qtn.TensorNetwork([ket, bra])
+
+    output_inds = (
+        [ket_ind_id.format(q) for q in fixed]
+        + [bra_ind_id.format(q) for q in fixed]
+        + [ket_ind_id.format(q) for q in group]
+    )
+    rho.full_simplify_(
+        simplify_sequence,
+        output_inds=output_inds,
+        atol=simplify_atol,
+        equalize_norms=True,
+    )
+    return rho
+
+
+def plan_marginal(tn, fixed, group, batch_size, ket_ind_id, bra_ind_id="b{}",
+                  optimize="auto-hq", backend=None, tree_store=None, reuse=None,
+                  max_memory=None, target_size=None, memory_limit=None, max_overhead=16.0,
+                  precision="double", rehearse_only=False):
+    """
+    Finds the contraction tree for a marginal network once projectors for
+    `batch_size` samples are attached to its fixed qubits. Every projector
+    carries the shared batch index, so parts of the network that do not
+    depend on the conditioned bits are contracted once for the whole batch.
+    If a `TreeStore` is given, the tree is looked up there before searching.
+    `reuse` maps structure keys to trees of other plans (see
+    `plan_tree_entries`) that are tried first. With `max_memory` (bytes) or
+    `target_size` (elements) the tree is sliced until its largest
+    intermediate fits (see `slice_tree`).
+
+    `memory_limit` (bytes) is a guard checked before anything is contracted:
+    a tree whose peak intermediate exceeds it is sliced to fit, and if that
+    is impossible or costs more than `max_overhead` times the flops,
+    `ContractionTooLarge` is raised so that the caller can re-plan.
+    The network arrays are cast to the dtype of `precision` (see
+    `PRECISIONS`); below double precision the complex128 arrays are kept
+    as well, as `arrays_double`, for `PeakSampler.precision_check`. With `rehearse_only`, the plan is not compiled (see
+    `compile_plan`), so nothing at all is contracted.
+
+    Returns:
+        dict: The network arrays, contraction inputs/output/sizes, tree and
+            slicing report.
+    """
+    arrays_double = [np.asarray(t.data, dtype=np.complex128) for t in tn]
+    arrays = [np.asarray(x, dtype=PRECISIONS[precision]) for x in arrays_double]
+    inputs = [tuple(t.inds) for t in tn]
+    size_dict = {ix: d for t in tn for ix, d in zip(t.inds, t.shape)}
+
+    projector_inds = []
+    for q in fixed:
+        projector_inds.append((BATCH_IND, ket_ind_id.format(q)))
+        projector_inds.append((BATCH_IND, bra_ind_id.format(q)))
+    inputs.extend(projector_inds)
+
+    output = tuple(ket_ind_id.format(q) for q in group)
+    if fixed:
+        output = (BATCH_IND,) + output
+        size_dict[BATCH_IND] = batch_size
+    for q in group:
+        size_dict[ket_ind_id.format(q)] = 2
+
+    structure, labels = canonical_structure(inputs, output, size_dict)
+    key = hash_structure(structure)
+    if reuse is not None and key in reuse:
+        tree = tree_from_entry(reuse[key], inputs, output, size_dict, labels)
+    elif tree_store is not None:
+        tree = tree_store.get_or_search(inputs, output, size_dict, optimize)
+    else:
+        tree = search_tree(inputs, output, size_dict, optimize)
+    dtype = np.result_type(*arrays)
+    tree, slicing = slice_tree(tree, max_memory=max_memory, target_size=target_size, dtype=dtype)
+    if memory_limit is not None and slicing["peak_bytes"] > memory_limit:
+        try:
+            tree, report = slice_tree(tree, max_memory=memory_limit, dtype=dtype)
+        except MemoryError:
+            report = None
+        if report is None or report["overhead"] * slicing["overhead"] > max_overhead:
+            raise ContractionTooLarge(
+                f"Group {tuple(group)} needs {slicing['peak_bytes']} bytes, "
+                f"more than the limit of {memory_limit} even when sliced."
+            )
+        logger.warning(
+            "Group %s: sliced into %d slices to fit %d bytes (%.2fx flops).",
+            tuple(group), report["nslices"], memory_limit, report["overhead"],
+        )
+        report["overhead"] *= slicing["overhead"]
+        slicing = report
+
+    plan = {
+        "fixed": tuple(fixed),
+        "group": tuple(group),
+        "arrays": arrays,
+        "inputs": inputs,
+        "output": output,
+        "size_dict": size_dict,
+        "tree": tree,
+        "slicing": slicing,
+    }
+    if precision != "double":
+        plan["arrays_double"] = arrays_double
+    if not rehearse_only:
+        compile_plan(plan, backend)
+    return plan
+
+
+def compile_plan(plan, backend=None):
+    """
+    Compiles the plan's tree into a contraction expression that holds the
+    network arrays as constants, so that only the projectors are passed in
+    per call. The first group conditions on nothing, so its marginal is
+    contracted here once and stored.
+    """
+    arrays = plan["arrays"]
+    if backend is not None:
+        arrays = [ar.do("array", x, like=backend) for x in arrays]
+    plan["backend"] = backend
+    plan["constant"] = None
+    if not plan["fixed"]:
+        plan["expr"] = None
+        plan["constant"] = normalize_marginals(plan["tree"].contract(arrays), plan["group"])
+        return plan
+    plan["expr"] = ctg.array_contract_expression(
+        plan["inputs"],
+        plan["output"],
+        size_dict=plan["size_dict"],
+        optimize=plan["tree"],
+        constants=dict(enumerate(arrays)),
+        canonicalize=False,
+    )
+    return plan
+
+
+def plan_tree_entries(plans):
+    """
+    Maps the structure key of every plan's contraction to its tree, in the
+    index-independent form `plan_marginal(..., reuse=)` expects.
+    """
+    entries = {}
+    for plan in plans:
+        structure, labels = canonical_structure(plan["inputs"], plan["output"], plan["size_dict"])
+        entries[hash_structure(structure)] = tree_to_entry(plan["tree"], labels)
+    return entries
+
+
+def _plan_guarded(circ, fixed, group, batch_size, ket_ind_id, simplify_sequence, simplify_atol,
+                  memory_limit, max_overhead, fallback=True, **kwargs):
+    """
+    Plans one group under a memory limit, falling back to a more aggressive
+    simplification and then to splitting the group in two. Without
+    `fallback`, a group that cannot be sliced to fit raises
+    `ContractionTooLarge` instead.
+
+    Returns:
+        list: The plans replacing the group, in sampling order.
+    """
+    sequences = [simplify_sequence]
+    if fallback and simplify_sequence != FALLBACK_SEQUENCE:
+        sequences.append(FALLBACK_SEQUENCE)
+    for sequence in sequences:
+        tn = build_marginal_network(
+            circ, fixed, group, ket_ind_id,
+            simplify_sequence=sequence,
+            simplify_atol=simplify_atol,
+        )
+        try:
+            plan = plan_marginal(
+                tn, fixed, group, batch_size, ket_ind_id,
+                memory_limit=memory_limit, max_overhead=max_overhead, **kwargs
+            )
+        except ContractionTooLarge as e:
+            if not fallback:
+                raise
+            logger.warning("%s", e)
+            continue
+        if sequence != simplify_sequence:
+            logger.warning("Group %s: re-simplified with %r to fit.", tuple(group), sequence)
+        return [plan]
+
+    if len(group) == 1:
+        raise ContractionTooLarge(f"Qubit {group[0]} cannot be sampled within {memory_limit} bytes.")
+    half = len(group) // 2
+    logger.warning("Group %s: split into %s and %s to fit.", tuple(group), group[:half], group[half:])
+    plans = _plan_guarded(circ, fixed, group[:half], batch_size, ket_ind_id, simplify_sequence,
+                          simplify_atol, memory_limit, max_overhead, **kwargs)
+    plans += _plan_guarded(circ, tuple(fixed) + tuple(group[:half]), group[half:], batch_size,
+                           ket_ind_id, simplify_sequence, simplify_atol, memory_limit,
+                           max_overhead, **kwargs)
+    return plans
+
+
+def rehearse_lockstep(circ, group_size=10, batch_size=64, optimize="auto-hq",
+                      simplify_sequence="ADCRS", simplify_atol=1e-6, backend=None,
+                      tree_store=None, reuse=None, max_memory=None, target_size=None,
+                      memory_limit=None, max_overhead=16.0, precision="double",
+                      rehearse_only=False, fallback=True):
+    """
+    Builds and plans the marginal network of every sampling group, sliced to
+    fit `max_memory` bytes or `target_size` elements if given. With
+    `rehearse_only`, only the trees are found (see `plan_marginal`).
+
+    With a `memory_limit` (bytes), every group's tree is checked before
+    anything is contracted. A group that does not fit is sliced (up to
+    `max_overhead` times the flops), else re-simplified with
+    `FALLBACK_SEQUENCE`, else split in two, and each change is logged.
+    Without `fallback`, the guard only slices, so the plans always match
+    the requested groups and simplification, and `ContractionTooLarge` is
+    raised when slicing is not enough.
+
+    Returns:
+        list: One plan (see `plan_marginal`) per group, in sampling order.
+    """
+    ket_ind_id = circ.psi.site_ind_id
+    plans = []
+    fixed = ()
+    for group in sampling_groups(circ, group_size):
+        plans.extend(_plan_guarded(
+            circ, fixed, group, batch_size, ket_ind_id, simplify_sequence, simplify_atol,
+            memory_limit, max_overhead, fallback=fallback,
+            optimize=optimize, backend=backend, tree_store=tree_store, reuse=reuse,
+            max_memory=max_memory, target_size=target_size, precision=precision,
+            rehearse_only=rehearse_only,
+        ))
+        fixed = fixed + group
+    return plans
+
+
+def normalize_marginals(p, group):
+    """
+    Turns raw marginal contractions into (n, 2**len(group)) probabilities,
+    accumulated in float64 whatever the contraction dtype.
+    """
+    p = np.real(ar.to_numpy(p)).astype(np.float64).reshape(-1, 2 ** len(group))
+    p = np.clip(p, 0.0, None)
+    return p / p.sum(axis=1, keepdims=True)
+
+
+def contract_marginals(plan, bits, executor=None):
+    """
+    Contracts one group's marginal for every row of `bits` at once.
+
+    Args:
+        plan (dict): A plan from `plan_marginal`.
+        bits (np.ndarray): (n, num_qubits) array holding the already
+            sampled bits of each sample.
+        executor (SlicedExecutor): Optional process pool that contracts the
+            slices of sliced (NumPy backend) trees in parallel.
+
+    Returns:
+        np.ndarray: (n, 2**len(group)) normalized conditional marginals.
+    """
+    n = bits.shape[0]
+    if plan["constant"] is not None:
+        # The first group conditions on nothing: one marginal serves every row.
+        return np.broadcast_to(plan["constant"], (n, plan["constant"].shape[1]))
+
+    batch_size = plan["size_dict"][BATCH_IND]
+    if n > batch_size:
+        # The tree was sized for `batch_size` rows; larger inputs would grow
+        # the intermediates past the planned peak, so contract in chunks.
+        return np.concatenate([
+            contract_marginals(plan, bits[start:start + batch_size], executor)
+            for start in range(0, n, batch_size)
+        ])
+
+    dtype = plan["arrays"][0].dtype
+    projectors = []
+    for q in plan["fixed"]:
+        projector = np.zeros((n, 2), dtype=dtype)
+        projector[np.arange(n), bits[:, q]] = 1
+        if plan["backend"] is not None:
+            projector = ar.do("array", projector, like=plan["backend"])
+        # The same projector closes both the ket and the bra side.
+        projectors.append(projector)
+        projectors.append(projector)
+
+    if executor is not None and plan["tree"].nslices > 1 and plan["backend"] is None:
+        # The network arrays stay in shared memory between calls.
+        arrays = list(plan["arrays"]) + projectors
+        p = executor.contract(plan["tree"], arrays, keep=range(len(plan["arrays"])))
+        return normalize_marginals(p, plan["group"])
+    return normalize_marginals(plan["expr"](*projectors), plan["group"])
+
+
+def draw_outcomes(p, rng):
+    """
+    Draws one outcome per row of the (n, k) probability matrix `p`.
+    """
+    cdf = np.cumsum(p, axis=1)
+    u = rng.random(p.shape[0]) * cdf[:, -1]
+    idx = (cdf < u[:, None]).sum(axis=1)
+    return np.minimum(idx, p.shape[1] - 1)
+
+
+def sample_plans(plans, num_qubits, n, rng, marginals=None):
+    """
+    Pushes `n` samples through all groups in lockstep.
+
+    Args:
+        marginals (callable): Optional `marginals(i, bits)` returning the
+            conditional marginals of group `i`; defaults to contracting them.
+
+    Returns:
+        np.ndarray: (n, num_qubits) uint8 array of sampled bits.
+    """
+    if marginals is None:
+        marginals = lambda i, bits: contract_marginals(plans[i], bits)
+    bits = np.zeros((n, num_qubits), dtype=np.uint8)
+    for i, plan in enumerate(plans):
+        group = plan["group"]
+        idx = draw_outcomes(marginals(i, bits), rng)
+        # The first qubit of the group is the most significant outcome bit.
+        shifts = np.arange(len(group) - 1, -1, -1)
+        bits[:, list(group)] = (idx[:, None] >> shifts) & 1
+    return bits
+
+
+def bits_to_strings(bits):
+    """
+    Converts an (n, num_qubits) bit array into a list of bitstrings.
+    """
+    chars = (np.asarray(bits, dtype=np.uint8) + ord("0")).view("S1")
+    return [row.tobytes().decode() for row in chars]
+
+
+def sample_lockstep(circ, C, group_size=10, optimize="auto-hq",
+                    simplify_sequence="ADCRS", simplify_atol=1e-6, seed=None, max_memory=None):
+    """
+    Batched counterpart of `circ.sample_gate_by_gate`: all `C` samples walk
+    the groups together and each group's marginal is contracted once for the
+    whole batch, with the conditioned bits of each sample as a batch index.
+
+    Args:
+        circ (qtn.Circuit): The circuit to sample.
+        C (int): Number of samples.
+        group_size (int): Number of qubits sampled per marginal.
+        optimize: cotengra optimizer or preset used for the contraction trees.
+        simplify_sequence (str): Local simplification sequence.
+        simplify_atol (float): Tolerance used by the simplifications.
+        seed: Seed or np.random.Generator.
+        max_memory (int): Optional bound in bytes on the largest
+            intermediate tensor; the contractions are sliced to fit it.
+
+    Yields:
+        str: Sampled bitstrings.
+    """
+    rng = np.random.default_rng(seed)
+    plans = rehearse_lockstep(
+        circ,
+        group_size=group_size,
+        batch_size=C,
+        optimize=optimize,
+        simplify_sequence=simplify_sequence,
+        simplify_atol=simplify_atol,
+        max_memory=max_memory,
+    )
+    yield from bits_to_strings(sample_plans(plans, circ.N, C, rng))
+
+
+class MarginalCache:
+    """
+    LRU cache of normalized conditional marginals.
+
+    Entries are keyed by (group index, bits of every previously sampled
+    group), so the keys form a trie over group outcomes flattened into one
+    ordered dict. Peaked circuits keep revisiting the same few prefixes,
+    which then cost a lookup instead of a contraction.
+
+    Args:
+        max_bytes (int): Memory bound for the stored marginals.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        # Lookups weighted by the sample rows sharing each prefix, and the
+        # raw per-prefix lookups.
+        self.hits = 0
+        self.misses = 0
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, rows=1):
+        """Looks up a prefix on behalf of `rows` samples."""
+        p = self._entries.get(key)
+        if p is None:
+            self.misses += rows
+            self.prefix_misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += rows
+        self.prefix_hits += 1
+        return p
+
+    def put(self, key, p):
+        if key in self._entries:
+            return
+        self._entries[key] = p
+        self.nbytes += p.nbytes
+        while self.nbytes > self.max_bytes and self._entries:
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """
+        Hit rates and memory use of the cache: hit_rate is the fraction of
+        sample rows served from the cache, prefix_hit_rate the fraction of
+        distinct prefixes looked up that were found.
+        """
+        lookups = self.hits + self.misses
+        prefix_lookups = self.prefix_hits + self.prefix_misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "prefix_hit_rate": self.prefix_hits / prefix_lookups if prefix_lookups else 0.0,
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+        }
+
+
+class PeakSampler:
+    """
+    Lockstep sampler that is rehearsed once and then kept in memory.
+
+    Each group's simplified network, contraction tree and compiled
+    contraction expression are built at construction time, so drawing
+    samples only pays for the numeric contractions: nothing is re-derived,
+    re-simplified or looked up in the optimizer again.
+
+    Args:
+        circ (qtn.Circuit): The circuit to sample.
+        group_size (int): Number of qubits sampled per marginal.
+        batch_size (int): Number of samples contracted together.
+        optimize: cotengra optimizer or preset used for the contraction trees.
+        simplify_sequence (str): Local simplification sequence.
+        simplify_atol (float): Tolerance used by the simplifications.
+        backend (str): Array backend for the contractions, e.g. "cupy".
+        seed: Seed or np.random.Generator.
+        cache_bytes (int): Memory bound of the conditional-marginal cache
+            (0 disables it).
+        tree_store (TreeStore): Optional on-disk store of contraction trees,
+            so a second run on the same circuit skips the path search.
+        template (PeakSampler): A sampler of a circuit with the same gate
+            topology (e.g. the same CZ pattern with other angles). The
+            networks are still simplified numerically, but wherever a
+            simplified network has the template's structure its tree is
+            reused instead of searched for.
+        topology_key (str): `circuit_topology_key` of the circuit, needed
+            to use it, or this sampler, as a template.
+        max_memory (int): Optional bound in bytes on the largest
+            intermediate tensor of any contraction; trees that exceed it
+            are sliced (see `slicing_report`).
+        target_size (int): The same bound in elements.
+        executor (SlicedExecutor): Optional process pool for the slices of
+            sliced contractions. It is not saved with the sampler and should
+            not be combined with a `SamplingPool`.
+        memory_limit (int): Guard in bytes checked on every group's tree
+            before contracting it; groups that exceed it are re-planned
+            (see `rehearse_lockstep`).
+        precision (str): "double" contracts in complex128, "single" in
+            complex64, which halves the memory traffic (see
+            `precision_check`). Normalization is always float64.
+    """
+
+    def __init__(self, circ, group_size=10, batch_size=64, optimize="auto-hq",
+                 simplify_sequence="ADCRS", simplify_atol=1e-6, backend=None, seed=None,
+                 cache_bytes=256 * 2**20, tree_store=None, template=None, max_memory=None,
+                 target_size=None, executor=None, memory_limit=None, precision="double",
+                 topology_key=None):
+        self.num_qubits = circ.N
+        self.topology_key = topology_key
+        reuse = None
+        if template is not None:
+            if topology_key is None or template.topology_key != topology_key:
+                raise ValueError("The template sampler was rehearsed for a different gate topology.")
+            reuse = plan_tree_entries(template.plans)
+        self.group_size = group_size
+        self.batch_size = batch_size
+        self.simplify_sequence = simplify_sequence
+        self.backend = backend
+        self.precision = precision
+        self.rng = np.random.default_rng(seed)
+        self.cache = MarginalCache(cache_bytes)
+        self.executor = executor
+        self.plans = rehearse_lockstep(
+            circ,
+            group_size=group_size,
+            batch_size=batch_size,
+            optimize=optimize,
+            simplify_sequence=simplify_sequence,
+            simplify_atol=simplify_atol,
+            backend=backend,
+            tree_store=tree_store,
+            reuse=reuse,
+            max_memory=max_memory,
+            target_size=target_size,
+            memory_limit=memory_limit,
+            precision=precision,
+        )
+
+    def draw(self, n):
+        """
+        Draws `n` samples, `batch_size` at a time.
+
+        Returns:
+            np.ndarray: (n, num_qubits) uint8 array of sampled bits.
+        """
+        chunks = []
+        for start in range(0, n, self.batch_size):
+            size = min(self.batch_size, n - start)
+            chunks.append(sample_plans(self.plans, self.num_qubits, size, self.rng, self.marginals))
+        if not chunks:
+            return np.zeros((0, self.num_qubits), dtype=np.uint8)
+        return np.concatenate(chunks)
+
+    def marginals(self, i, bits):
+        """
+        Conditional marginals of group `i` for every row of `bits`. Rows are
+        deduplicated by their conditioned prefix, cached prefixes are looked
+        up and only the remaining ones are contracted, in one batch.
+
+        Returns:
+            np.ndarray: (n, 2**len(group)) normalized conditional marginals.
+        """
+        plan = self.plans[i]
+        if plan["constant"] is not None or self.cache.max_bytes <= 0:
+            return contract_marginals(plan, bits, self.executor)
+
+        prefixes = np.packbits(bits[:, list(plan["fixed"])], axis=1)
+        unique, first, inverse = np.unique(prefixes, axis=0, return_index=True, return_inverse=True)
+        p = np.empty((unique.shape[0], 2 ** len(plan["group"])))
+        keys = [(i, row.tobytes()) for row in unique]
+        inverse = inverse.reshape(-1)
+        rows = np.bincount(inverse, minlength=len(keys)).tolist()
+        missing = []
+        for j, key in enumerate(keys):
+            cached = self.cache.get(key, rows=rows[j])
+            if cached is None:
+                missing.append(j)
+            else:
+                p[j] = cached
+        if missing:
+            p[missing] = contract_marginals(plan, bits[first[missing]], self.executor)
+            for j in missing:
+                self.cache.put(keys[j], p[j].copy())
+        return p[inverse]
+
+    def beam_search(self, beam_width=8):
+        """
+        Deterministic decoding: walks the sampling groups and keeps the
+        `beam_width` most probable prefixes at each step instead of drawing
+        random samples. A peak carrying O(1) probability survives in the
+        beam, so one pass of about num_qubits / group_size batched
+        contractions per beam entry finds it.
+
+        Returns:
+            list: (bitstring, probability) pairs of the best complete
+                bitstrings, most probable first. The probabilities are the
+                products of the conditional marginals along each path.
+        """
+        bits = np.zeros((1, self.num_qubits), dtype=np.uint8)
+        log_p = np.zeros(1)
+        for i, plan in enumerate(self.plans):
+            group = plan["group"]
+            with np.errstate(divide="ignore"):
+                scores = (log_p[:, None] + np.log(self.marginals(i, bits))).ravel()
+            keep = min(beam_width, scores.size)
+            best = np.argpartition(scores, -keep)[-keep:]
+            best = best[np.argsort(scores[best])[::-1]]
+            rows, outcomes = np.divmod(best, 2 ** len(group))
+            bits = bits[rows]
+            shifts = np.arange(len(group) - 1, -1, -1)
+            bits[:, list(group)] = (outcomes[:, None] >> shifts) & 1
+            log_p = scores[best]
+        return list(zip(bits_to_strings(bits), np.exp(log_p).tolist()))
+
+    def precision_check(self, num_rows=64, seed=None):
+        """
+        Re-contracts the marginals of `num_rows` random prefixes in double
+        precision, from the unrounded network arrays, and compares them with
+        the sampler's own contractions.
+        The prefixes are drawn with a separate RNG, so the sampler's stream
+        is unaffected.
+
+        Returns:
+            dict: max_deviation, the largest absolute difference of any
+                marginal probability, and per_group, the largest per group.
+        """
+        bits = sample_plans(self.plans, self.num_qubits, num_rows, np.random.default_rng(seed))
+        per_group = []
+        for plan in self.plans:
+            reference = dict(plan, arrays=plan.get("arrays_double", plan["arrays"]))
+            compile_plan(reference, self.backend)
+            deviation = np.abs(contract_marginals(plan, bits) - contract_marginals(reference, bits))
+            per_group.append(float(deviation.max()))
+        return {"max_deviation": max(per_group), "per_group": per_group}
+
+    def slicing_report(self):
+        """
+        Slices, peak intermediate size and flop overhead over all groups.
+
+        Returns:
+            dict: nslices and max_size per group, the largest peak_bytes and
+                overhead, the total flops relative to the unsliced trees.
+        """
+        nslices, max_size, peak_bytes = [], [], 0
+        flops = unsliced = 0.0
+        for plan in self.plans:
+            report = plan["slicing"]
+            nslices.append(report["nslices"])
+            max_size.append(report["max_size"])
+            peak_bytes = max(peak_bytes, report["peak_bytes"])
+            flops += float(plan["tree"].total_flops())
+            unsliced += float(plan["tree"].total_flops()) / report["overhead"]
+        return {
+            "nslices": nslices,
+            "max_size": max_size,
+            "peak_bytes": peak_bytes,
+            "overhead": flops / unsliced if unsliced else 1.0,
+        }
+
+    def cache_stats(self):
+        """Hit rate and memory use of the conditional-marginal cache."""
+        return self.cache.stats()
+
+    def stream(self):
+        """
+        Yields batches of `batch_size` samples forever.
+        """
+        while True:
+            yield self.draw(self.batch_size)
+
+    def save(self, path):
+        """
+        Pickles the rehearsed sampler (networks, trees and RNG) to `path`,
+        atomically. The compiled expressions are rebuilt by `load`.
+        """
+        state = dict(self.__dict__)
+        state["plans"] = [{k: v for k, v in plan.items() if k != "expr"} for plan in self.plans]
+        state["cache"] = MarginalCache(self.cache.max_bytes)
+        state["executor"] = None
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".pkl")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Restores a sampler saved with `save` without repeating the rehearsal.
+        """
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        sampler = cls.__new__(cls)
+        sampler.executor = None
+        sampler.__dict__.update(state)
+        for plan in sampler.plans:
+            compile_plan(plan, sampler.backend)
+        return sampler
+
+
+def rehearse_variants(circuits, fusion="none", **kwargs):
+    """
+    Rehearses a batch of circuits, using the first sampler of each gate
+    topology as the template of the others, so that parametric variants
+    of one circuit only pay for one path search.
+
+    Args:
+        circuits (list): `CircuitIR` instances.
+        fusion (str): Gate fusion the circuits are built with (see
+            `CircuitIR.to_quimb`).
+        kwargs: Passed on to `PeakSampler`.
+
+    Returns:
+        list: One `PeakSampler` per circuit, in order.
+    """
+    templates = {}
+    samplers = []
+    for ir in circuits:
+        key = circuit_topology_key(ir, fusion)
+        sampler = PeakSampler(ir.to_quimb(fusion=fusion), template=templates.get(key),
+                              topology_key=key, **kwargs)
+        templates.setdefault(key, sampler)
+        samplers.append(sampler)
+    return samplers
@@ -0,0 +1,159 @@
+import itertools
+import time
+
+import numpy as np
+import cotengra as ctg
+
+from peak_sampler import ContractionTooLarge, rehearse_lockstep
+
+
+def calibrate(size=512, repeats=3, dtype=np.complex128):
+    """
+    Measures this machine's contraction throughput in cotengra's units.
+
+    Times a (size x size) matrix product, whose flops are counted by a
+    cotengra tree, and a copy of a large array for the write bandwidth.
+
+    Returns:
+        dict: flops_per_sec and bytes_per_sec.
+    """
+    inputs = [("a", "b"), ("b", "c")]
+    output = ("a", "c")
+    size_dict = {"a": size, "b": size, "c": size}
+    tree = ctg.ContractionTree.from_path(inputs, output, size_dict, path=[(0, 1)])
+    rng = np.random.default_rng(0)
+    x = (rng.random((size, size)) + 1j * rng.random((size, size))).astype(dtype)
+    y = (rng.random((size, size)) + 1j * rng.random((size, size))).astype(dtype)
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        tree.contract([x, y])
+        best = min(best, time.perf_counter() - start)
+    flops_per_sec = float(tree.total_flops()) / best
+
+    big = np.ones(1 << 24, dtype=dtype)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        big.copy()
+        best = min(best, time.perf_counter() - start)
+    bytes_per_sec = big.nbytes / best
+
+    return {"flops_per_sec": flops_per_sec, "bytes_per_sec": bytes_per_sec}
+
+
+def group_costs(plans):
+    """
+    Cost of every group's contraction tree in rehearsed plans (see
+    `rehearse_lockstep`), read from the trees alone.
+
+    Returns:
+        list: One dict per group with flops, width (log2 of the largest
+            intermediate), write (elements written) and peak_bytes.
+    """
+    costs = []
+    for plan in plans:
+        tree = plan["tree"]
+        itemsize = np.result_type(*plan["arrays"]).itemsize
+        costs.append({
+            "group": plan["group"],
+            # Groups conditioning on nothing are contracted once.
+            "constant": not plan["fixed"],
+            "flops": float(tree.total_flops()),
+            "width": float(tree.contraction_width()),
+            "write": float(tree.total_write()),
+            "peak_bytes": int(tree.max_size()) * itemsize,
+            "itemsize": itemsize,
+        })
+    return costs
+
+
+def predict(costs, batch_size, calibration):
+    """
+    Predicts the time per sample and the peak memory of a rehearsal.
+
+    Groups that condition on nothing are contracted once and do not count
+    towards the time per sample; every other group costs its flops at the
+    calibrated rate plus its writes at the calibrated bandwidth, per batch.
+
+    Returns:
+        dict: seconds_per_sample and peak_bytes.
+    """
+    seconds = 0.0
+    for cost in costs:
+        if cost["constant"]:
+            continue
+        seconds += cost["flops"] / calibration["flops_per_sec"]
+        seconds += cost["write"] * cost["itemsize"] / calibration["bytes_per_sec"]
+    return {
+        "seconds_per_sample": seconds / batch_size,
+        "peak_bytes": max(cost["peak_bytes"] for cost in costs),
+    }
+
+
+def recommend(circ, group_sizes=(5, 10, 15), simplify_sequences=("ADCRS", "DCRS", "CRS"),
+              batch_size=64, optimize="auto-hq", max_memory=None, tree_store=None,
+              calibration=None):
+    """
+    Ranks sampler settings by predicted time per sample, rehearsing each
+    candidate once instead of sampling with it. Only the contraction trees
+    are found: nothing is compiled or contracted, and with `max_memory`
+    every group's tree is only sliced to fit (see `rehearse_lockstep`), so
+    each row is the cost of the setting it names.
+
+    Args:
+        circ (qtn.Circuit): The circuit.
+        group_sizes (tuple): Candidate group sizes.
+        simplify_sequences (tuple): Candidate simplification sequences.
+        batch_size (int): Samples contracted together.
+        optimize: cotengra optimizer or preset used for the contraction trees.
+        max_memory (int): Memory limit in bytes of every group's contraction;
+            settings that cannot be planned within it are ranked last.
+        tree_store (TreeStore): Optional on-disk store of contraction trees.
+        calibration (dict): Result of `calibrate`, measured if not given.
+
+    Returns:
+        list: One dict per setting (group_size, simplify_sequence,
+            rehearsal_seconds, seconds_per_sample, peak_bytes, fits), best
+            first.
+    """
+    if calibration is None:
+        calibration = calibrate()
+    rows = []
+    for group_size, simplify_sequence in itertools.product(group_sizes, simplify_sequences):
+        start = time.perf_counter()
+        try:
+            plans = rehearse_lockstep(
+                circ,
+                group_size=group_size,
+                batch_size=batch_size,
+                optimize=optimize,
+                simplify_sequence=simplify_sequence,
+                tree_store=tree_store,
+                memory_limit=max_memory,
+                rehearse_only=True,
+                fallback=False,
+            )
+        except ContractionTooLarge:
+            rows.append({
+                "group_size": group_size,
+                "simplify_sequence": simplify_sequence,
+                "rehearsal_seconds": time.perf_counter() - start,
+                "seconds_per_sample": float("inf"),
+                "peak_bytes": None,
+                "fits": False,
+            })
+            continue
+        rehearsal_seconds = time.perf_counter() - start
+        prediction = predict(group_costs(plans), batch_size, calibration)
+        rows.append({
+            "group_size": group_size,
+            "simplify_sequence": simplify_sequence,
+            "rehearsal_seconds": rehearsal_seconds,
+            "seconds_per_sample": prediction["seconds_per_sample"],
+            "peak_bytes": prediction["peak_bytes"],
+            "fits": max_memory is None or prediction["peak_bytes"] <= max_memory,
+        })
+    rows.sort(key=lambda row: (not row["fits"], row["seconds_per_sample"]))
+    return rows
@@ -0,0 +1,258 @@
+import re
+
+import numpy as np
+
+# Op codes of the gate set of the hackathon circuits. A parsed circuit
+# keeps its own `op_names` table, which the fallback parser may extend.
+OP_NAMES = ["rz", "sx", "x", "cz", "measure", "u3"]
+RZ, SX, X, CZ, MEASURE, U3 = range(len(OP_NAMES))
+
+# Number of parameters of the parameterized gates; a circuit stores up to
+# three per statement.
+NUM_PARAMS = {
+    "rz": 1, "rx": 1, "ry": 1, "p": 1, "u1": 1, "u2": 2, "u3": 3, "u": 3,
+    "crz": 1, "crx": 1, "cry": 1, "cp": 1, "cu1": 1, "rzz": 1, "rxx": 1, "ryy": 1,
+}
+MAX_PARAMS = 3
+
+# qiskit method of gates it only exposes under another name.
+_QISKIT_METHODS = {"u3": "u", "u1": "p", "cu1": "cp"}
+
+# Supported statements, matched over the whole file at once.
+# Both only match whole statements, starting a line or following a ';'.
+_GATE = re.compile(
+    r"(?:^|(?<=;))\s*(rz|sx|x|cz|measure|u3|u)\s*(?:\(\s*([^)]*?)\s*\))?\s+q\[(\d+)\]"
+    r"\s*(?:,\s*q\[(\d+)\]|->\s*c\[(\d+)\])?\s*;",
+    re.M,
+)
+_HEADER = re.compile(
+    r"(?:^|(?<=;))\s*(?:OPENQASM\s[^;]*|include\s[^;]*|creg\s+\w+\[\d+\]|qreg\s+q\[(\d+)\])\s*;",
+    re.M,
+)
+_COMMENT = re.compile(r"//[^\n]*")
+
+SX_MATRIX = 0.5 * np.array([[1 + 1j, 1 - 1j], [1 - 1j, 1 + 1j]])
+
+
+def parse_qasm(path=None, text=None):
+    """
+    Parses an OpenQASM 2 circuit into columnar NumPy arrays in one pass.
+
+    Files that only use `rz`, `sx`, `x`, `cz`, `u3` (or `u`) and `measure`
+    on one quantum register (all the hackathon circuits, and the output of
+    `gate_fusion.fused_to_qasm`) are matched with a single regex scan. Any other statement makes the whole file go through qiskit's
+    parser instead (see `_parse_with_qiskit`).
+
+    Args:
+        path (str): QASM file to read.
+        text (str): QASM source, instead of `path`.
+
+    Returns:
+        dict: num_qubits, op_names (list of gate names) and, one entry per
+            statement, op_code (index into op_names), q0, q1 (second qubit,
+            or the classical bit of a measurement, -1 otherwise) and params
+            (an (n, 3) array of the gate parameters, zero-padded).
+    """
+    if text is None:
+        with open(path, "r") as f:
+            text = f.read()
+    source = _COMMENT.sub("", text)
+
+    headers = _HEADER.findall(source)
+    gates = _GATE.findall(source)
+    if len(headers) + len(gates) != source.count(";") or len([q for q in headers if q]) != 1:
+        return _parse_with_qiskit(text)
+
+    names, angles, q0, q1, cbit = zip(*gates) if gates else [()] * 5
+    lookup = {name: code for code, name in enumerate(OP_NAMES)}
+    lookup["u"] = U3
+    params = np.zeros((len(gates), MAX_PARAMS))
+    for i, (name, a) in enumerate(zip(names, angles)):
+        if not a:
+            continue
+        try:
+            values = [float(v) for v in a.split(",")]
+        except ValueError:
+            # Symbolic parameters such as "pi/2".
+            return _parse_with_qiskit(text)
+        if len(values) != NUM_PARAMS.get(name, 0):
+            return _parse_with_qiskit(text)
+        params[i, :len(values)] = values
+    return {
+        "num_qubits": int(next(q for q in headers if q)),
+        "op_names": list(OP_NAMES),
+        "op_code": np.fromiter((lookup[name] for name in names), dtype=np.int8, count=len(gates)),
+        "q0": np.fromiter(map(int, q0), dtype=np.int64, count=len(gates)),
+        "q1": np.fromiter((int(b or c or -1) for b, c in zip(q1, cbit)), dtype=np.int64, count=len(gates)),
+        "params": params,
+    }
+
+
+def _parse_with_qiskit(text):
+    """
+    Fallback for statements outside the fast gate set: parses with qiskit
+    and converts its instructions to the same arrays, adding new gate names
+    to the op table. Gates with more than three parameters or more than two
+    qubits are not supported.
+    """
+    from qiskit import QuantumCircuit
+
+    qc = QuantumCircuit.from_qasm_str(text)
+    op_names = list(OP_NAMES)
+    op_code, q0, q1, params = [], [], [], []
+    for instruction in qc.data:
+        op = instruction.operation
+        if op.name == "barrier":
+            continue
+        if len(op.params) > MAX_PARAMS or len(instruction.qubits) > 2:
+            raise ValueError(f"Gate {op.name} is not supported by the circuit arrays.")
+        if op.name not in op_names:
+            op_names.append(op.name)
+        qubits = [qc.find_bit(q).index for q in instruction.qubits]
+        op_code.append(op_names.index(op.name))
+        q0.append(qubits[0])
+        if len(qubits) > 1:
+            q1.append(qubits[1])
+        elif instruction.clbits:
+            q1.append(qc.find_bit(instruction.clbits[0]).index)
+        else:
+            q1.append(-1)
+        row = [float(p) for p in op.params]
+        params.append(row + [0.0] * (MAX_PARAMS - len(row)))
+    return {
+        "num_qubits": qc.num_qubits,
+        "op_names": op_names,
+        "op_code": np.array(op_code, dtype=np.int8),
+        "q0": np.array(q0, dtype=np.int64),
+        "q1": np.array(q1, dtype=np.int64),
+        "params": np.array(params, dtype=np.float64).reshape(-1, MAX_PARAMS),
+    }
+
+
+def gate_names(arrays):
+    """Gate name of every statement."""
+    return np.array(arrays["op_names"])[arrays["op_code"]]
+
+
+def cz_edges(arrays):
+    """
+    Qubit pairs of all CZ gates, smaller index first, as an (m, 2) array.
+    """
+    is_cz = gate_names(arrays) == "cz"
+    pairs = np.stack([arrays["q0"][is_cz], arrays["q1"][is_cz]], axis=1)
+    return np.sort(pairs, axis=1)
+
+
+def select_ops(arrays, mask):
+    """The circuit restricted to the statements where `mask` is true."""
+    out = dict(arrays)
+    for key in ("op_code", "q0", "q1", "params"):
+        out[key] = arrays[key][mask]
+    return out
+
+
+def remap_qubits(arrays, exclude=(), max_qubits=None):
+    """
+    Drops every statement touching an excluded qubit and renumbers the
+    remaining qubits 0, 1, ... in order of first appearance.
+
+    Returns:
+        tuple: (remapped arrays, old qubit index of each new index).
+    """
+    is_two_qubit = arrays["q1"] >= 0
+    is_two_qubit &= gate_names(arrays) != "measure"
+    exclude = np.asarray(sorted(exclude), dtype=np.int64)
+    keep = ~np.isin(arrays["q0"], exclude) & ~(is_two_qubit & np.isin(arrays["q1"], exclude))
+    out = select_ops(arrays, keep)
+    is_two_qubit = is_two_qubit[keep]
+
+    # Qubits in order of first appearance over (q0, q1) of each statement.
+    touched = np.stack([out["q0"], np.where(is_two_qubit, out["q1"], -1)], axis=1).ravel()
+    touched = touched[touched >= 0]
+    unique, first = np.unique(touched, return_index=True)
+    order = unique[np.argsort(first)]
+    if max_qubits is not None:
+        order = order[:max_qubits]
+        keep = np.isin(out["q0"], order) & (~is_two_qubit | np.isin(out["q1"], order))
+        out = select_ops(out, keep)
+        is_two_qubit = is_two_qubit[keep]
+
+    new_index = np.full(arrays["num_qubits"], -1, dtype=np.int64)
+    new_index[order] = np.arange(len(order))
+    out["q0"] = new_index[out["q0"]]
+    out["q1"] = np.where(is_two_qubit, new_index[np.maximum(out["q1"], 0)], out["q1"])
+    out["num_qubits"] = len(order)
+    return out, order
+
+
+def to_qasm(arrays):
+    """Writes the circuit arrays back out as OpenQASM 2 source."""
+    n = arrays["num_qubits"]
+    names = gate_names(arrays)
+    # Measurements keep their classical bits, which may outnumber the qubits.
+    clbits = max([n] + [b + 1 for b in arrays["q1"][names == "measure"].tolist()])
+    lines = ["OPENQASM 2.0;", 'include "qelib1.inc";', f"qreg q[{n}];", f"creg c[{clbits}];"]
+    for name, a, b, params in zip(names, arrays["q0"].tolist(), arrays["q1"].tolist(), arrays["params"].tolist()):
+        if name == "measure":
+            lines.append(f"measure q[{a}] -> c[{b}];")
+            continue
+        if NUM_PARAMS.get(name, 0):
+            name = f"{name}({','.join(repr(p) for p in params[:NUM_PARAMS[name]])})"
+        if b >= 0:
+            lines.append(f"{name} q[{a}],q[{b}];")
+        else:
+            lines.append(f"{name} q[{a}];")
+    return "\n".join(lines) + "\n"
+
+
+def to_quimb(arrays, **circuit_opts):
+    """
+    Builds a `qtn.Circuit` from the circuit arrays (measurements dropped).
+    `sx` and the one-qubit gates quimb has no name for are applied as raw
+    2x2 matrices (see `gate_fusion.single_qubit_matrix`), and two-qubit
+    gates other than `cz` as raw 4x4 matrices.
+    """
+    import quimb.tensor as qtn
+    from gate_fusion import TWO_QUBIT_GATES, single_qubit_matrix
+
+    circ = qtn.Circuit(arrays["num_qubits"], **circuit_opts)
+    names = gate_names(arrays)
+    for name, a, b, params in zip(names, arrays["q0"].tolist(), arrays["q1"].tolist(), arrays["params"].tolist()):
+        if name == "rz":
+            circ.apply_gate("RZ", params[0], a)
+        elif name == "x":
+            circ.apply_gate("X", a)
+        elif name == "cz":
+            circ.apply_gate("CZ", a, b)
+        elif name == "measure":
+            continue
+        elif b >= 0:
+            if name not in TWO_QUBIT_GATES:
+                raise ValueError(f"Gate {name} has no quimb conversion.")
+            circ.apply_gate(TWO_QUBIT_GATES[name], a, b)
+        else:
+            circ.apply_gate(single_qubit_matrix(name, params), a)
+    return circ
+
+
+def to_qiskit(arrays):
+    """Builds a qiskit `QuantumCircuit` from the circuit arrays."""
+    from qiskit import QuantumCircuit
+
+    n = arrays["num_qubits"]
+    qc = QuantumCircuit(n, n)
+    names = gate_names(arrays)
+    for name, a, b, params in zip(names, arrays["q0"].tolist(), arrays["q1"].tolist(), arrays["params"].tolist()):
+        if name == "measure":
+            qc.measure(a, b)
+            continue
+        params = params[:NUM_PARAMS.get(name, 0)]
+        if name == "u2":
+            # u2(phi, lambda) = u(pi/2, phi, lambda).
+            name, params = "u", [np.pi / 2] + params
+        gate = getattr(qc, _QISKIT_METHODS.get(name, name))
+        if b >= 0:
+            gate(*params, a, b)
+        else:
+            gate(*params, a)
+    return qc
@@ -0,0 +1,238 @@
+import hashlib
+import os
+
+import numpy as np
+
+from majority_vote import unpack_samples
+
+# File layout: one 64-byte header followed by `words` little-endian uint64
+# words per sample. A sample stores int(bitstring, 2) split big-endian into
+# words, so qubit 0 is the most significant bit (BIT_ORDER_QUBIT0_MSB).
+MAGIC = b"PEAKSMP1"
+VERSION = 1
+BIT_ORDER_QUBIT0_MSB = 0
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("num_qubits", "<u4"),
+    ("words", "<u4"),
+    ("bit_order", "<u4"),
+    ("seed", "<i8"),
+    ("circuit_hash", "S32"),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+WORD_DTYPE = np.dtype("<u8")
+
+
+def words_per_sample(num_qubits):
+    """Number of uint64 words needed to store one sample."""
+    return -(-num_qubits // 64)
+
+
+def file_hash(path):
+    """Returns the SHA-256 digest of a file, e.g. the circuit's QASM."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def pack_bits(bits):
+    """
+    Packs an (n, num_qubits) bit array into (n, words) uint64 words.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    n, num_qubits = bits.shape
+    words = words_per_sample(num_qubits)
+    # Left-pad to whole words so that each word is a plain big-endian integer.
+    padded = np.zeros((n, 64 * words), dtype=np.uint8)
+    padded[:, 64 * words - num_qubits:] = bits
+    as_bytes = np.packbits(padded, axis=1).reshape(n, words, 8)
+    return as_bytes.view(">u8").reshape(n, words).astype(WORD_DTYPE)
+
+
+def read_header(path):
+    """
+    Reads and validates the header of a binary sample log.
+
+    Returns:
+        dict: num_qubits, words, bit_order, seed and circuit_hash.
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if header.size != 1 or header["magic"][0] != MAGIC:
+        raise ValueError(f"{path} is not a binary sample log.")
+    if header["version"][0] != VERSION:
+        raise ValueError(f"Unsupported sample log version {header['version'][0]} in {path}.")
+    return {
+        "num_qubits": int(header["num_qubits"][0]),
+        "words": int(header["words"][0]),
+        "bit_order": int(header["bit_order"][0]),
+        "seed": int(header["seed"][0]),
+        "circuit_hash": bytes(header["circuit_hash"][0]),
+    }
+
+
+def open_sample_log(path):
+    """
+    Memory-maps a binary sample log without copying it.
+
+    Returns:
+        tuple: (header dict, read-only (n, words) uint64 memmap).
+    """
+    header = read_header(path)
+    row_bytes = header["words"] * WORD_DTYPE.itemsize
+    # Ignore a trailing partial sample left by an interrupted write.
+    n = (os.path.getsize(path) - HEADER_SIZE) // row_bytes
+    if n == 0:
+        return header, np.zeros((0, header["words"]), dtype=WORD_DTYPE)
+    samples = np.memmap(path, dtype=WORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(n, header["words"]))
+    return header, samples
+
+
+class SampleLogWriter:
+    """
+    Append-only writer for the binary sample log.
+
+    Appending to an existing log checks that its header matches.
+
+    Args:
+        path (str): Output file.
+        num_qubits (int): Number of qubits per sample.
+        circuit_hash (bytes): SHA-256 of the circuit (see `file_hash`).
+        seed (int): Seed of the sampling run, -1 if unknown.
+    """
+
+    def __init__(self, path, num_qubits, circuit_hash=b"", seed=-1):
+        self.path = path
+        self.num_qubits = num_qubits
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            header = read_header(path)
+            if header["num_qubits"] != num_qubits:
+                raise ValueError(f"{path} holds {header['num_qubits']}-qubit samples, not {num_qubits}.")
+            if circuit_hash and header["circuit_hash"] != circuit_hash:
+                raise ValueError(f"{path} was written for a different circuit.")
+            if header["words"] != words_per_sample(num_qubits):
+                raise ValueError(f"{path} stores {header['words']} words per sample, not "
+                                 f"{words_per_sample(num_qubits)}.")
+            row_bytes = header["words"] * WORD_DTYPE.itemsize
+            self.num_samples = (os.path.getsize(path) - HEADER_SIZE) // row_bytes
+            # Drop a trailing partial sample left by an interrupted write, so
+            # new samples start on a row boundary.
+            truncate_sample_log(path, self.num_samples)
+            self._file = open(path, "ab")
+        else:
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header["magic"] = MAGIC
+            header["version"] = VERSION
+            header["num_qubits"] = num_qubits
+            header["words"] = words_per_sample(num_qubits)
+            header["bit_order"] = BIT_ORDER_QUBIT0_MSB
+            header["seed"] = seed
+            header["circuit_hash"] = circuit_hash
+            self.num_samples = 0
+            self._file = open(path, "wb")
+            self._file.write(header.tobytes())
+
+    def write(self, bits):
+        """Appends an (n, num_qubits) bit array."""
+        self._file.write(pack_bits(bits).tobytes())
+        self.num_samples += len(bits)
+
+    def flush(self):
+        self._file.flush()
+
+    def sync(self):
+        """Flushes and forces the written samples to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def truncate_sample_log(path, num_samples):
+    """
+    Cuts a log back to its first `num_samples` samples, e.g. to drop samples
+    written after the checkpoint a run is resumed from.
+    """
+    header = read_header(path)
+    row_bytes = header["words"] * WORD_DTYPE.itemsize
+    with open(path, "r+b") as f:
+        f.truncate(HEADER_SIZE + num_samples * row_bytes)
+
+
+def bit_counts_from_log(path, chunk_size=1 << 20):
+    """
+    Counts the ones of every bit over all samples, in chunks of the memmap
+    (one byte per bit and sample of a chunk is unpacked at a time).
+
+    Returns:
+        tuple: (ones per bit as an int64 array, number of samples).
+    """
+    header, samples = open_sample_log(path)
+    ones = np.zeros(header["num_qubits"], dtype=np.int64)
+    for start in range(0, samples.shape[0], chunk_size):
+        bits = unpack_samples(samples[start:start + chunk_size], header["num_qubits"], packed=True)
+        ones += bits.sum(axis=0, dtype=np.int64)
+    return ones, samples.shape[0]
+
+
+def majority_vote_from_log(path):
+    """
+    Bitwise majority vote over a binary sample log (ties decode to '0').
+    """
+    ones, n = bit_counts_from_log(path)
+    return ((2 * ones > n).astype(np.uint8) + ord("0")).tobytes().decode()
+
+
+def sample_histogram(path):
+    """
+    Counts how often every distinct sample occurs.
+
+    Returns:
+        tuple: (distinct samples as (k, words) uint64, their counts),
+            sorted by decreasing count.
+    """
+    _, samples = open_sample_log(path)
+    if samples.shape[1] == 1:
+        distinct, counts = np.unique(samples[:, 0], return_counts=True)
+        distinct = distinct[:, None]
+    else:
+        distinct, counts = np.unique(samples, axis=0, return_counts=True)
+    order = np.argsort(counts, kind="stable")[::-1]
+    return distinct[order], counts[order]
+
+
+def words_to_strings(words, num_qubits):
+    """Converts packed (n, words) samples back into bitstrings."""
+    bits = unpack_samples(words, num_qubits, packed=True)
+    return [row.tobytes().decode() for row in (bits + ord("0")).view("S1")]
+
+
+def convert_text_log(text_path, log_path, num_qubits, circuit_hash=b"", seed=-1, chunk_lines=1 << 20):
+    """
+    Converts a text log of bitstrings (one per line) into a binary log.
+    Lines with an unexpected length are skipped, as in the text readers.
+    """
+    with open(text_path, "r") as f, SampleLogWriter(log_path, num_qubits, circuit_hash, seed) as log:
+        lines = []
+        for line in f:
+            sample = line.strip()
+            if len(sample) == num_qubits:
+                lines.append(sample)
+            if len(lines) == chunk_lines:
+                log.write(_strings_to_bits(lines))
+                lines = []
+        if lines:
+            log.write(_strings_to_bits(lines))
+
+
+def _strings_to_bits(lines):
+    return np.frombuffer("".join(lines).encode(), dtype=np.uint8).reshape(len(lines), -1) - ord("0")
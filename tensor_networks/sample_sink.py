@@ -0,0 +1,175 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+def atomic_write_json(path, obj):
+    """
+    Writes `obj` as JSON to `path` through a temporary file and a rename,
+    so readers only ever see the old or the new file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def sampling_state(votes, rng=None, pool=None):
+    """
+    Snapshot of a sampling run to store in a checkpoint: the vote counts
+    and the RNG state of the in-process sampler (`rng`) or of every worker
+    of a `SamplingPool` (`pool`).
+    """
+    state = {
+        "num_samples": int(votes.num_samples),
+        "ones": votes.ones.tolist(),
+        # Worker count of the run, checked when it is resumed.
+        "workers": 1 if pool is None else pool.num_workers,
+    }
+    if rng is not None:
+        state["rng_state"] = rng.bit_generator.state
+    if pool is not None:
+        state["pool"] = pool.state()
+    return state
+
+
+class BufferedSampleSink:
+    """
+    Buffers sample batches in memory and writes them to a `SampleLogWriter`
+    from a background thread, every `flush_samples` samples or every
+    `flush_interval` seconds, whichever comes first.
+
+    After each flush the log is synced to disk and the latest state passed
+    to `put` is written atomically to `checkpoint_path`, so the checkpoint
+    never counts samples that are not in the log and a crash loses at most
+    one flush interval.
+
+    Args:
+        log (SampleLogWriter): Destination log.
+        flush_samples (int): Flush once this many samples are pending.
+        flush_interval (float): Flush at least this often (seconds).
+        checkpoint_path (str): Optional JSON checkpoint file.
+    """
+
+    def __init__(self, log, flush_samples=1 << 16, flush_interval=10.0, checkpoint_path=None):
+        self.log = log
+        self.flush_samples = flush_samples
+        self.flush_interval = flush_interval
+        self.checkpoint_path = checkpoint_path
+        self._pending = []
+        self._pending_count = 0
+        self._state = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        # Exception raised by a background flush, re-raised to the caller.
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, bits, state=None):
+        """
+        Queues an (n, num_qubits) bit array, with the run state reached
+        after it (see `sampling_state`).
+
+        Raises the exception of a failed background flush, if any.
+        """
+        self._raise_error()
+        with self._lock:
+            self._pending.append(bits)
+            self._pending_count += bits.shape[0]
+            if state is not None:
+                self._state = state
+            if self._pending_count >= self.flush_samples:
+                self._wake.set()
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except BaseException as e:
+                # Stop flushing; put() and close() report the failure.
+                self._error = e
+                return
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError("Writing the sample log or checkpoint failed.") from self._error
+
+    def flush(self):
+        """Writes all pending samples, then the checkpoint."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._pending_count = self._pending, [], 0
+                state, self._state = self._state, None
+            if pending:
+                self.log.write(np.concatenate(pending))
+                self.log.sync()
+            if state is not None and self.checkpoint_path is not None:
+                # Record how long the log was, so a resumed run can drop
+                # anything written after this checkpoint.
+                state["log_samples"] = int(self.log.num_samples)
+                atomic_write_json(self.checkpoint_path, state)
+
+    def close(self):
+        """
+        Stops the background thread and flushes what is left, or raises the
+        exception of a failed background flush.
+        """
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+        try:
+            self._raise_error()
+            self.flush()
+        finally:
+            self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ProgressLine:
+    """
+    Rate-limited progress report: prints at most once every `interval`
+    seconds instead of once per sample.
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def update(self, votes, force=False, extra=None):
+        """
+        Prints the sample count, rate and current decode if the interval
+        has passed. `extra` may be a callable returning more text to show.
+        """
+        now = time.perf_counter()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        elapsed = now - self._start
+        rate = votes.num_samples / elapsed if elapsed > 0 else 0.0
+        line = f"{votes.num_samples} samples ({rate:.1f}/s), majority vote: {votes.bitstring}"
+        if extra is not None:
+            line += f", {extra()}"
+        print(line, flush=True)
@@ -0,0 +1,159 @@
+import queue
+import multiprocessing as mp
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+from majority_vote import VoteAccumulator
+
+
+def _sample_worker(sampler, worker_id, seed_seq, rng_state, first_batch, out_queue, stop_event, blas_threads):
+    """
+    Worker loop: draws batches with its own RNG stream and ships them,
+    bit-packed and numbered, to the parent process together with the RNG
+    state reached after each batch.
+    """
+    sampler.rng = np.random.default_rng(seed_seq)
+    if rng_state is not None:
+        sampler.rng.bit_generator.state = rng_state
+    with threadpool_limits(limits=blas_threads):
+        batch_no = first_batch
+        while not stop_event.is_set():
+            bits = sampler.draw(sampler.batch_size)
+            packed = np.packbits(bits, axis=1)
+            item = (worker_id, batch_no, packed, sampler.rng.bit_generator.state)
+            while not stop_event.is_set():
+                try:
+                    out_queue.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            batch_no += 1
+
+
+class SamplingPool:
+    """
+    Runs `num_workers` copies of a rehearsed `PeakSampler` in forked
+    processes and merges their samples into one stream.
+
+    The sampler is rehearsed in the parent and inherited by the workers
+    through fork, so no worker repeats the path search. Worker `i` draws
+    from child stream `i` of `np.random.SeedSequence(seed).spawn(num_workers)`
+    and batches are merged round-robin by worker and batch number, so the
+    merged stream is reproducible for a fixed seed and worker count.
+
+    Args:
+        sampler (PeakSampler): A rehearsed sampler.
+        num_workers (int): Number of sampling processes.
+        seed (int): Root seed of the worker RNG streams.
+        sink (callable): Optional function called with every merged
+            (batch_size, num_qubits) bit array, e.g. a file writer.
+        blas_threads (int): BLAS threads allowed per worker.
+        max_pending (int): Batches each worker may queue ahead of the merge.
+        state (dict): Optional `state()` of an earlier pool with the same
+            seed and worker count, to continue its merged stream exactly.
+        poll_interval (float): Seconds between checks that the workers are
+            still alive while waiting for a batch.
+    """
+
+    def __init__(self, sampler, num_workers, seed=42, sink=None, blas_threads=1, max_pending=4,
+                 state=None, poll_interval=1.0):
+        self.num_qubits = sampler.num_qubits
+        self.poll_interval = poll_interval
+        self.num_workers = num_workers
+        self.seed = seed
+        self.sink = sink
+        # Merged per-bit counter of every sample the pool has yielded.
+        self.votes = VoteAccumulator(self.num_qubits)
+
+        ctx = mp.get_context("fork")
+        self._queue = ctx.Queue(maxsize=max_pending * num_workers)
+        self._stop = ctx.Event()
+        self._pending = [dict() for _ in range(num_workers)]
+        self._next = [0] * num_workers
+        self._turn = 0
+        # RNG state of each worker after its last merged batch.
+        self._rng_states = [None] * num_workers
+        if state is not None:
+            if state["seed"] != seed or state["num_workers"] != num_workers:
+                raise ValueError("Pool state was saved with a different seed or worker count.")
+            self._next = list(state["next_batch"])
+            self._turn = state["turn"]
+            self._rng_states = list(state["rng_states"])
+        self._workers = [
+            ctx.Process(
+                target=_sample_worker,
+                args=(sampler, i, child, self._rng_states[i], self._next[i],
+                      self._queue, self._stop, blas_threads),
+                daemon=True,
+            )
+            for i, child in enumerate(np.random.SeedSequence(seed).spawn(num_workers))
+        ]
+        for w in self._workers:
+            w.start()
+
+    def _next_batch(self):
+        """
+        Returns the next batch in merge order, buffering batches that
+        arrive early from other workers. Raises `RuntimeError` if a worker
+        has died (e.g. of a `MemoryError` in `draw`), since its batches
+        would never arrive.
+        """
+        worker = self._turn
+        while self._next[worker] not in self._pending[worker]:
+            try:
+                worker_id, batch_no, packed, rng_state = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            self._pending[worker_id][batch_no] = (packed, rng_state)
+        packed, self._rng_states[worker] = self._pending[worker].pop(self._next[worker])
+        self._next[worker] += 1
+        self._turn = (worker + 1) % self.num_workers
+        return np.unpackbits(packed, axis=1, count=self.num_qubits)
+
+    def _check_workers(self):
+        """Raises if a worker has exited; they only stop when closed."""
+        for i, w in enumerate(self._workers):
+            if not w.is_alive():
+                raise RuntimeError(f"Sampling worker {i} exited with code {w.exitcode}.")
+
+    def __iter__(self):
+        """
+        Yields merged batches forever, updating the counter and the sink.
+        """
+        while True:
+            bits = self._next_batch()
+            self.votes.add(bits)
+            if self.sink is not None:
+                self.sink(bits)
+            yield bits
+
+    def state(self):
+        """
+        Merge position and per-worker RNG states after the last merged batch.
+        """
+        return {
+            "seed": self.seed,
+            "num_workers": self.num_workers,
+            "turn": self._turn,
+            "next_batch": list(self._next),
+            "rng_states": list(self._rng_states),
+        }
+
+    def close(self):
+        """
+        Stops and joins all workers.
+        """
+        self._stop.set()
+        for w in self._workers:
+            w.join(timeout=5)
+            if w.is_alive():
+                w.terminate()
+        self._queue.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
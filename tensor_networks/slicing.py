@@ -0,0 +1,185 @@
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+
+def budget_to_target_size(max_memory, dtype=np.complex128):
+    """
+    Converts a memory budget in bytes into the largest number of elements
+    an intermediate tensor of `dtype` may have.
+    """
+    return max(1, int(max_memory) // np.dtype(dtype).itemsize)
+
+
+def slice_tree(tree, max_memory=None, target_size=None, dtype=np.complex128):
+    """
+    Slices a contraction tree until its largest intermediate fits the
+    budget, given either in bytes (`max_memory`) or in elements
+    (`target_size`). Output indices, such as the batch index, are never
+    sliced. The tree is returned unchanged if neither budget is set or it
+    already fits; otherwise a sliced copy is returned, so trees shared with
+    an optimizer cache are not modified.
+
+    Returns:
+        tuple: (tree, report) where report holds nslices, max_size
+            (elements) and peak_bytes of the returned tree, and overhead,
+            its total flops relative to the tree passed in.
+    """
+    flops = float(tree.total_flops())
+    if target_size is None and max_memory is not None:
+        target_size = budget_to_target_size(max_memory, dtype)
+    if target_size is not None and tree.max_size() > target_size:
+        tree = tree.slice(target_size=target_size, allow_outer=False)
+        if tree.max_size() > target_size:
+            raise MemoryError(
+                f"Could not slice the contraction below {target_size} elements "
+                f"(largest intermediate: {tree.max_size()})."
+            )
+    max_size = int(tree.max_size())
+    report = {
+        "nslices": int(tree.nslices),
+        "max_size": max_size,
+        "peak_bytes": max_size * np.dtype(dtype).itemsize,
+        "overhead": float(tree.total_flops()) / flops if flops else 1.0,
+    }
+    return tree, report
+
+
+def tree_sum(parts):
+    """
+    Sums a list of arrays pairwise, as a balanced binary tree, which keeps
+    the rounding error of long sums of partial contractions small.
+    """
+    parts = list(parts)
+    while len(parts) > 1:
+        paired = [parts[i] + parts[i + 1] for i in range(0, len(parts) - 1, 2)]
+        if len(parts) % 2:
+            paired.append(parts[-1])
+        parts = paired
+    return parts[0]
+
+
+# Shared memory blocks of persistent arrays attached by this worker, by name.
+_ATTACHED = {}
+
+
+def _contract_slices(tree, specs, transient, start, stop, blas_threads):
+    """
+    Worker task: contracts slices `start` to `stop` of `tree` over the
+    shared arrays and returns their sum. Blocks named in `transient` are
+    only used by this call and are detached again afterwards.
+    """
+    opened = []
+    arrays = []
+    for name, shape, dtype in specs:
+        if name in _ATTACHED:
+            shm = _ATTACHED[name]
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            if name in transient:
+                opened.append(shm)
+            else:
+                _ATTACHED[name] = shm
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    try:
+        with threadpool_limits(limits=blas_threads):
+            parts = [tree.contract_slice(arrays, i) for i in range(start, stop)]
+        # Copy out so that nothing refers to the shared buffers any more.
+        return np.array(tree_sum(parts))
+    finally:
+        del arrays
+        for shm in opened:
+            shm.close()
+
+
+class SlicedExecutor:
+    """
+    Contracts the slices of a sliced tree in a pool of forked processes.
+
+    The input arrays are copied once into shared memory, which the workers
+    map instead of receiving pickled copies; arrays passed again in later
+    calls (e.g. a plan's constant network arrays) are not copied again.
+    Each worker sums a contiguous chunk of slices and the chunks are summed
+    in a tree reduction.
+
+    Args:
+        num_workers (int): Number of processes, all cores by default.
+        blas_threads (int): BLAS threads allowed per worker.
+        chunks_per_worker (int): Chunks of slices queued per worker and
+            call, to balance uneven slices.
+    """
+
+    def __init__(self, num_workers=None, blas_threads=1, chunks_per_worker=4):
+        self.num_workers = num_workers or os.cpu_count()
+        self.blas_threads = blas_threads
+        self.chunks_per_worker = chunks_per_worker
+        self._pool = ProcessPoolExecutor(self.num_workers, mp_context=mp.get_context("fork"))
+        # Fork the workers now rather than on the first contraction, which
+        # may come after the caller has started threads (e.g. a sample sink).
+        self._pool.submit(int).result()
+        # id(array) -> (array, shared memory block, spec) of shared arrays.
+        self._shared = {}
+
+    def _share(self, x):
+        entry = self._shared.get(id(x))
+        if entry is not None and entry[0] is x:
+            return entry[2]
+        data = np.ascontiguousarray(x)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+        spec = (shm.name, data.shape, data.dtype.str)
+        # Keep `x` alive so its id is not reused by another array.
+        self._shared[id(x)] = (x, shm, spec)
+        return spec
+
+    def _release(self, x):
+        _, shm, _ = self._shared.pop(id(x))
+        shm.close()
+        shm.unlink()
+
+    def contract(self, tree, arrays, keep=None):
+        """
+        Contracts `arrays` with a (sliced) tree. Arrays listed by index in
+        `keep` stay in shared memory for later calls; the others are
+        released afterwards.
+
+        Returns:
+            np.ndarray: The full contraction, summed over all slices.
+        """
+        if tree.nslices == 1:
+            return tree.contract(arrays)
+        keep = set(range(len(arrays))) if keep is None else set(keep)
+        specs = [self._share(x) for x in arrays]
+        transient = {specs[i][0] for i in range(len(arrays)) if i not in keep}
+        try:
+            num_chunks = min(tree.nslices, self.num_workers * self.chunks_per_worker)
+            bounds = np.linspace(0, tree.nslices, num_chunks + 1).astype(int)
+            futures = [
+                self._pool.submit(
+                    _contract_slices, tree, specs, transient, start, stop, self.blas_threads
+                )
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            return tree_sum([f.result() for f in futures])
+        finally:
+            for i, x in enumerate(arrays):
+                if i not in keep and id(x) in self._shared:
+                    self._release(x)
+
+    def close(self):
+        """Shuts the pool down and frees all shared memory."""
+        self._pool.shutdown()
+        for key in list(self._shared):
+            _, shm, _ = self._shared.pop(key)
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
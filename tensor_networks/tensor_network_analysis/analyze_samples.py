@@ -1,7 +1,12 @@
+import os
+import sys
 import numpy as np
 from collections import defaultdict, Counter
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sample_log import majority_vote_from_log, open_sample_log, sample_histogram, words_to_strings
+
 def majority_vote_from_file(filename, num_qubits):
     """
     Reads a text file of bitstrings and returns the final bitstring
@@ -57,19 +62,51 @@ def check_repeats_from_file(filename, num_qubits):
     repeats = {b: c for b, c in counter.items() if c > 1}
     return repeats
 
+def check_repeats_from_log(filename):
+    """
+    Binary-log counterpart of `check_repeats_from_file`, computed on the
+    memory-mapped samples.
+    """
+    header, samples = open_sample_log(filename)
+    print(f"Total samples processed: {samples.shape[0]}")
+    distinct, counts = sample_histogram(filename)
+    repeated = counts > 1
+    bitstrings = words_to_strings(distinct[repeated], header["num_qubits"])
+    return dict(zip(bitstrings, counts[repeated].tolist()))
+
 if __name__ == "__main__":
-    filename = "./tensor_networks/samples.txt"  # File with your bitstring samples
-    num_qubits = 60  # Adjust based on your circuit
+    # File with your bitstring samples: a binary sample log (.bin) or text.
+    filename = sys.argv[1] if len(sys.argv) > 1 else "./tensor_networks/samples.bin"
+    num_qubits = 60  # Adjust based on your circuit (text files only)
+    binary = filename.endswith(".bin")
 
     # Compute and print the final bitstring via majority vote.
-    final_bitstring = majority_vote_from_file(filename, num_qubits)
+    if binary:
+        final_bitstring = majority_vote_from_log(filename)
+    else:
+        final_bitstring = majority_vote_from_file(filename, num_qubits)
     print(f"Final bitstring (majority vote):\n{final_bitstring}")
 
     # Check for any repeated bitstrings and print them.
-    repeats = check_repeats_from_file(filename, num_qubits)
+    if binary:
+        repeats = check_repeats_from_log(filename)
+    else:
+        repeats = check_repeats_from_file(filename, num_qubits)
     if repeats:
         print("\nRepeated bitstrings found:")
         for bit, count in repeats.items():
             print(f"{bit} → {count} occurrences")
     else:
         print("\nNo repeated bitstrings found.")
+
+    # Optionally certify the decode against the circuit (QASM file as the
+    # second argument): hill-climb over its Hamming-1 neighbours.
+    if len(sys.argv) > 2:
+        from certify import certify_peak
+        from circuit_ir import CircuitIR
+
+        circ = CircuitIR.from_qasm(sys.argv[2]).to_quimb()
+        result = certify_peak(circ, final_bitstring)
+        print(f"\nCertified peak after {result['moves']} moves:\n{result['bitstring']}")
+        print(f"p = {result['probability']:.6e}, best neighbour p = {result['neighbour_probability']:.6e} "
+              f"(margin {result['margin']:.6e}, ratio {result['ratio']:.2f})")
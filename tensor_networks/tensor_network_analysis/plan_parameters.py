@@ -0,0 +1,48 @@
+import os
+import sys
+import cotengra as ctg
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from planner import calibrate, recommend
+from circuit_ir import CircuitIR
+from tree_store import TreeStore
+
+def main():
+    # Circuit to plan for (QASM file as the first argument).
+    qasm_file = sys.argv[1] if len(sys.argv) > 1 else './circuit_3_60q.qasm'
+    print("Loading circuit...")
+    circ = CircuitIR.from_qasm(qasm_file).to_quimb()
+    print("Circuit loaded.")
+
+    # Measure this machine once; the predictions are scaled by it.
+    calibration = calibrate()
+    print(f"Calibrated {calibration['flops_per_sec']:.3e} flops/s, "
+          f"{calibration['bytes_per_sec'] / 2**30:.1f} GB/s.")
+
+    opt = ctg.ReusableHyperOptimizer(
+        parallel=True,
+        optlib="optuna",
+        max_time="rate:1e8",
+        progbar=False,
+    )
+
+    # Rehearse every candidate (no sampling) and rank by predicted cost.
+    rows = recommend(
+        circ,
+        group_sizes=(5, 10, 15),
+        simplify_sequences=("ADCRS", "DCRS", "CRS", "CR", "C"),
+        batch_size=64,
+        optimize=opt,
+        max_memory=32 * 2**30,
+        tree_store=TreeStore(namespace="optuna"),
+        calibration=calibration,
+    )
+    df = pd.DataFrame(rows)
+    print("\nSettings ranked by predicted time per sample:")
+    print(df)
+    best = rows[0]
+    print(f"\nRecommended: group_size={best['group_size']}, simplify_sequence={best['simplify_sequence']}")
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,16 @@ import numpy as np
 import cotengra as ctg
 import itertools
 import os
-# Setup: Initialize the circuit with 60 qubits and load the QASM file.
-circ = qtn.Circuit(N=60)
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from circuit_ir import CircuitIR
+
+# Setup: load the 60-qubit QASM file.
 print("Loading circuit...")
-circ = circ.from_openqasm2_file(
+circ = CircuitIR.from_qasm(
     '/Users/mridul.sarkar/Documents/BlueQubitHackathon/circuit_3_60q.qasm'
-)
+).to_quimb()
 print("Circuit loaded.\n")
 
 
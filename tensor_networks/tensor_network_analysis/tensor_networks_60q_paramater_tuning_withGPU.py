@@ -6,9 +6,14 @@ import time
 import itertools
 import matplotlib.pyplot as plt
 import pandas as pd
-from collections import defaultdict
 import os
-import tempfile
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from peak_sampler import PeakSampler
+from circuit_ir import CircuitIR
+from tree_store import TreeStore
+from majority_vote import VoteAccumulator
 
 def format_time(seconds):
     """Return a formatted string for a time duration."""
@@ -19,62 +24,52 @@ def format_time(seconds):
         rem_seconds = seconds % 60
         return f"{minutes} minutes {rem_seconds:.2f} seconds"
 
-def compute_majority_vote(bit_counts, num_qubits):
-    """Return the majority vote bitstring from position-wise counts."""
-    final_bits = []
-    for i in range(num_qubits):
-        count_0 = bit_counts[i].get('0', 0)
-        count_1 = bit_counts[i].get('1', 0)
-        final_bits.append('1' if count_1 > count_0 else '0')
-    return ''.join(final_bits)
-
-def run_experiment(tn_circuit, optimizer_lib, group_size, simplify_sequence, sample_batch_size, target_bitstring):
+def run_experiment(tn_circuit, optimizer_lib, group_size, simplify_sequence, sample_batch_size, target_bitstring,
+                   error_rate=1e-3):
+    """
+    Samples until the sequential majority-vote rule settles (the target is
+    only used to check the decode) and returns the average sample time, the
+    time and number of samples to the decision, and whether it was correct.
+    """
     local_circuit = copy.deepcopy(tn_circuit)
-    temp_dir = tempfile.mkdtemp(prefix=f"optimizer_{optimizer_lib}_")
     opt = ctg.ReusableHyperOptimizer(
         parallel=True,
         optlib=optimizer_lib,
         max_time="rate:1e8",
-        directory=temp_dir,
         progbar=False,
     )
+    # Trees are shared across experiments and runs, but not across optimizers.
+    tree_store = TreeStore(namespace=optimizer_lib)
 
-    local_circuit.sample_gate_by_gate_rehearse(
+    sampler = PeakSampler(
+        local_circuit,
         group_size=group_size,
+        batch_size=sample_batch_size,
         optimize=opt,
-        simplify_sequence=simplify_sequence
+        simplify_sequence=simplify_sequence,
+        backend='cupy',
+        seed=42,
+        tree_store=tree_store,
     )
 
-    num_qubits = len(target_bitstring)
-    position_counts = [defaultdict(int) for _ in range(num_qubits)]
-    samples_count = 0
-    rng = np.random.default_rng(42)
+    votes = VoteAccumulator(len(target_bitstring))
 
     start_time = time.perf_counter()
     while True:
-        for b in local_circuit.sample_gate_by_gate(
-            sample_batch_size,
-            group_size=group_size,
-            optimize=opt,
-            simplify_sequence=simplify_sequence,
-            seed=rng,
-            backend='cupy'):
-            samples_count += 1
-            for i, bit in enumerate(b):
-                position_counts[i][bit] += 1
-            current_vote = compute_majority_vote(position_counts, num_qubits)
-            if current_vote == target_bitstring:
-                end_time = time.perf_counter()
-                total_time = end_time - start_time
-                avg_sample_time = total_time / samples_count
-                return avg_sample_time, total_time, samples_count
+        votes.add(sampler.draw(sample_batch_size))
+        stop, current_vote, _ = votes.decision(error_rate=error_rate)
+        if stop:
+            end_time = time.perf_counter()
+            total_time = end_time - start_time
+            samples_count = votes.num_samples
+            avg_sample_time = total_time / samples_count
+            return avg_sample_time, total_time, samples_count, current_vote == target_bitstring
 
 
 def main_tuning():
     # --- Load the circuit ---
     print("Loading circuit...")
-    circ = qtn.Circuit(N=60)
-    tn_circuit = circ.from_openqasm2_file('./circuit_3_60q.qasm')
+    tn_circuit = CircuitIR.from_qasm('./circuit_3_60q.qasm').to_quimb()
     print("Circuit loaded.")
     
     # --- Define the parameter grid ---
@@ -83,7 +78,7 @@ def main_tuning():
     group_size_values = [5, 10, 15, 20, 25]
     sample_batch_size_values = [1, 5, 10]
     
-    # Define the target bitstring (60 bits long).
+    # Known answer (60 bits long), only used to check the decode.
     target_bitstring = "110101001011010101111001011100001110101101111010100110110001"
     
     results = []
@@ -93,7 +88,7 @@ def main_tuning():
         try:
             print(f"Testing: optimizer={optimizer_lib}, simplify_sequence={simplify_sequence}, "
                   f"group_size={group_size}, sample_batch_size={sample_batch_size}")
-            avg_time, time_to_target, samples_count = run_experiment(
+            avg_time, time_to_decision, samples_count, correct = run_experiment(
                 tn_circuit, optimizer_lib, group_size, simplify_sequence,
                 sample_batch_size, target_bitstring)
             results.append({
@@ -102,10 +97,12 @@ def main_tuning():
                 "group_size": group_size,
                 "sample_batch_size": sample_batch_size,
                 "avg_sample_time": avg_time,
-                "time_to_target": time_to_target,
-                "samples_to_target": samples_count
+                "time_to_decision": time_to_decision,
+                "samples_to_decision": samples_count,
+                "decoded_correct": correct
             })
-            print(f"  -> Avg sample time: {avg_time:.4f} sec, Time to target: {time_to_target:.4f} sec, Samples: {samples_count}\n")
+            print(f"  -> Avg sample time: {avg_time:.4f} sec, Time to decision: {time_to_decision:.4f} sec, "
+                  f"Samples: {samples_count}, Correct: {correct}\n")
         except Exception as e:
             print(f"Failed for parameters {optimizer_lib}, {simplify_sequence}, group_size={group_size}, "
                   f"sample_batch_size={sample_batch_size} with error: {e}")
@@ -120,8 +117,8 @@ def main_tuning():
     os.makedirs(output_dir, exist_ok=True)
     
     metrics = [("avg_sample_time", "Avg Sample Time (sec)"),
-               ("time_to_target", "Time to Target (sec)"),
-               ("samples_to_target", "Samples to Target")]
+               ("time_to_decision", "Time to Decision (sec)"),
+               ("samples_to_decision", "Samples to Decision")]
     
     fig, axes = plt.subplots(len(optimizer_types), len(simplify_sequences)*len(metrics),
                              figsize=(20, 8), squeeze=False)
@@ -1,10 +1,17 @@
-import quimb.tensor as qtn
-import numpy as np
 import cotengra as ctg
-from collections import defaultdict
 from multiprocessing import freeze_support
+import os
+import sys
 import time  # For timing
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from peak_sampler import PeakSampler
+from circuit_ir import CircuitIR
+from tree_store import TreeStore
+from majority_vote import VoteAccumulator
+from sample_log import SampleLogWriter, file_hash
+from sample_sink import BufferedSampleSink, ProgressLine
+
 def format_time(seconds):
     """Return a formatted string for a time duration in minutes and seconds if > 60 sec, otherwise in seconds."""
     if seconds < 60:
@@ -14,26 +21,14 @@ def format_time(seconds):
         rem_seconds = seconds % 60
         return f"{minutes} minutes {rem_seconds:.2f} seconds"
 
-def compute_majority_vote(bit_counts, num_qubits):
-    """Return the majority vote bitstring from current per-position counts."""
-    final_bits = []
-    for i in range(num_qubits):
-        count_0 = bit_counts[i].get('0', 0)
-        count_1 = bit_counts[i].get('1', 0)
-        # In case of a tie, choose '1'
-        final_bits.append('1' if count_1 > count_0 else '0')
-    return ''.join(final_bits)
-
 def main():
     overall_start = time.perf_counter()
     
-    # Setup: Initialize the circuit with 60 qubits and load the QASM file.
-    circ = qtn.Circuit(N=60)
+    # Setup: load the 60-qubit QASM file.
     print("Loading circuit...")
     load_start = time.perf_counter()
-    tensor_network_circuit = circ.from_openqasm2_file(
-        './circuit_3_60q.qasm'
-    )
+    qasm_file = './circuit_3_60q.qasm'
+    tensor_network_circuit = CircuitIR.from_qasm(qasm_file).to_quimb()
     load_end = time.perf_counter()
     print("Circuit loaded.\n")
     print(f"Loading circuit took {format_time(load_end - load_start)}.")
@@ -45,7 +40,6 @@ def main():
         parallel=True,
         optlib="optuna",
         max_time="rate:1e8",  # Limit optimization time.
-        directory=True,
         progbar=True,
     )
     opt_end = time.perf_counter()
@@ -54,68 +48,64 @@ def main():
     # Rehearse the sampling path (pre-optimizes contraction paths for each marginal).
     print("Optimizing contraction path...")
     path_opt_start = time.perf_counter()
-    rehs = tensor_network_circuit.sample_gate_by_gate_rehearse(
-        group_size=10,
+    sample_batch_size = 64  # Samples contracted together per group.
+    sampler = PeakSampler(
+        tensor_network_circuit,
+        group_size=5,
+        batch_size=sample_batch_size,
         optimize=opt,
-        simplify_sequence="ADCRS"  # Using "ADCRS" for simplification.
+        simplify_sequence="ADCRS",  # Using "ADCRS" for simplification.
+        seed=42,
+        tree_store=TreeStore(),  # Trees found by earlier runs are reused.
     )
     path_opt_end = time.perf_counter()
     print(f"Contraction path optimization took {format_time(path_opt_end - path_opt_start)}.")
     
-    # Define target bitstring and number of qubits.
+    # Known answer, only used to report whether the decode is right.
     target_bitstring = "110101001011010101111001011100001110101101111010100110110001"
     num_qubits = 60
+    # Allowed probability that the decoded bitstring has any wrong bit.
+    error_rate = 1e-3
 
-    # Prepare to continuously sample and save each bitstring to a file.
-    output_file = "./tensor_networks/samples.txt"
-    with open(output_file, "a") as f:
+    # Prepare to continuously sample and save each sample to a binary log.
+    output_file = "./tensor_networks/samples.bin"
+    log = SampleLogWriter(output_file, num_qubits, circuit_hash=file_hash(qasm_file), seed=42)
+    # Samples are buffered and written by a background thread.
+    with BufferedSampleSink(log, flush_interval=10.0) as sink:
         print("Starting continuous sampling and appending to file...")
         sample_loop_start = time.perf_counter()
-        # Maintain position-wise counts for majority vote.
-        position_counts = [defaultdict(int) for _ in range(num_qubits)]
-        rng = np.random.default_rng(42)
-        sample_batch_size = 1  # One sample per batch.
+        # Maintain per-bit counts for the majority vote.
+        votes = VoteAccumulator(num_qubits)
+        progress = ProgressLine(interval=5.0)
         sample_count = 0
 
         # Continuous sampling loop.
         while True:
             sample_iter_start = time.perf_counter()
-            # Generate one sample.
-            for b in tensor_network_circuit.sample_gate_by_gate(
-                sample_batch_size,
-                group_size=5,
-                optimize=opt,
-                simplify_sequence="ADCRS",
-                seed=rng
-            ):
-                sample_iter_end = time.perf_counter()
-                sample_time = sample_iter_end - sample_iter_start
-                sample_count += 1
-                print(f"Sample {sample_count}: {b} (took {format_time(sample_time)})")
-                
-                # Write sample to file.
-                f.write(b + "\n")
-                f.flush()  # Ensure persistence in case of interruption.
-                
-                # Update per-qubit counts.
-                for i, bit in enumerate(b):
-                    position_counts[i][bit] += 1
-                
-                # Check current majority vote.
-                current_vote = compute_majority_vote(position_counts, num_qubits)
-                if current_vote == target_bitstring:
-                    solution_time = time.perf_counter() - sample_loop_start
-                    print(f"\nTarget bitstring achieved after {sample_count} samples in {format_time(solution_time)}.")
-                    return
+            # Generate one batch of samples.
+            bits = sampler.draw(sample_batch_size)
+            sample_time = (time.perf_counter() - sample_iter_start) / len(bits)
+            sample_count += len(bits)
+            # Queue the batch for the log.
+            sink.put(bits)
+
+            # Update per-bit counts for the whole batch.
+            flipped = votes.add(bits)
+            if flipped.size:
+                print(f"Majority flipped on bits {flipped.tolist()}: {votes.bitstring}")
+            progress.update(votes)
+
+            # Stop once every bit's majority is significant.
+            stop, current_vote, confidences = votes.decision(error_rate=error_rate)
+            if stop:
+                solution_time = time.perf_counter() - sample_loop_start
+                print(f"\nMajority vote settled after {sample_count} samples in {format_time(solution_time)} "
+                      f"({format_time(sample_time)} per sample in the last batch).")
+                print(f"Decoded bitstring: {current_vote}")
+                print(f"Lowest per-bit confidence: {confidences.min():.6f}")
+                print(f"Matches known target: {current_vote == target_bitstring}")
+                return
 
-                # Reset timer for next sample.
-                sample_iter_start = time.perf_counter()
-                
-            # Log total sampling time every 10 samples.
-            if sample_count % 10 == 0:
-                current_time = time.perf_counter()
-                elapsed = current_time - sample_loop_start
-                print(f"Processed {sample_count} samples in {format_time(elapsed)}.")
     
     overall_end = time.perf_counter()
     print(f"Overall process took {format_time(overall_end - overall_start)}.")
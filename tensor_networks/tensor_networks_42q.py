@@ -1,11 +1,10 @@
 import quimb.tensor as qtn
 from collections import Counter
-# Initialize the circuit with 42 qubits.
-circ = qtn.Circuit(N=42)
+from circuit_ir import CircuitIR
 
-# Load QASM circuit.
+# Load the 42-qubit QASM circuit.
 print("Loading circuit from QASM file...")
-circ = circ.from_openqasm2_file('./circuit_2_42q.qasm')
+circ = CircuitIR.from_qasm('./circuit_2_42q.qasm').to_quimb()
 print("Circuit loaded.\n")
 
 # Dictionary to count occurrences of each bitstring.
@@ -1,59 +1,189 @@
-import quimb.tensor as qtn
-import numpy as np
 import cotengra as ctg
-from collections import defaultdict
+import argparse
+import atexit
+import json
+import logging
+import os
 from multiprocessing import freeze_support
+from peak_sampler import PeakSampler
+from tree_store import TreeStore
+from slicing import SlicedExecutor
+from gate_fusion import FUSION_LEVELS
+from circuit_cache import CircuitCache
+from qubit_marginals import decode_marginals, qubit_marginals
+from sampling_pool import SamplingPool
+from majority_vote import VoteAccumulator
+from sample_log import SampleLogWriter, file_hash, truncate_sample_log
+from sample_sink import BufferedSampleSink, ProgressLine, sampling_state
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Continuously sample the 60-qubit peak circuit.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of forked sampling processes (1 samples in-process).")
+    parser.add_argument("--seed", type=int, default=42, help="Root RNG seed.")
+    parser.add_argument("--checkpoint-dir", default="./tensor_networks/checkpoint",
+                        help="Directory for periodic checkpoints of the counts and RNG state.")
+    parser.add_argument("--flush-interval", type=float, default=10.0,
+                        help="Seconds between flushes of the sample log and checkpoint.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the rehearsal, counts and RNG state in --checkpoint-dir.")
+    parser.add_argument("--beam", type=int, default=0,
+                        help="Decode with a beam search of this width instead of sampling.")
+    parser.add_argument("--marginals", action="store_true",
+                        help="Decode from the exact one-qubit marginals (one light-cone contraction per qubit) instead of sampling.")
+    parser.add_argument("--max-memory-gb", type=float, default=None,
+                        help="Slice the contractions so no intermediate exceeds this many GB.")
+    parser.add_argument("--memory-limit-gb", type=float, default=None,
+                        help="Re-plan (slice, re-simplify or split) any group whose contraction would exceed this many GB.")
+    parser.add_argument("--precision", choices=["double", "single"], default="double",
+                        help="Contraction precision (single = complex64, normalized in float64).")
+    parser.add_argument("--slice-workers", type=int, default=1,
+                        help="Processes contracting the slices of sliced marginals (with --workers 1).")
+    parser.add_argument("--fuse", choices=FUSION_LEVELS, default="none",
+                        help="Gate fusion applied before building the tensor network (1q = one 2x2 tensor per one-qubit run).")
+    return parser.parse_args()
+
+def load_checkpoint(args, sampler_path, checkpoint_path, output_file):
+    """
+    Reads the checkpoint to resume from, failing with a clear message when
+    it is missing or was written with another worker count.
+    """
+    for path in (sampler_path, checkpoint_path, output_file):
+        if not os.path.exists(path):
+            raise SystemExit(f"Cannot resume: {path} does not exist (the run stopped before its "
+                             f"first checkpoint?). Start again without --resume.")
+    with open(checkpoint_path, "r") as f:
+        state = json.load(f)
+    workers = state["workers"]
+    if workers != args.workers:
+        raise SystemExit(f"Cannot resume: {checkpoint_path} was written with --workers {workers}, "
+                         f"not --workers {args.workers}. Resume with --workers {workers}.")
+    return state
 
 def main():
-    # Setup: Initialize the circuit with 60 qubits and load the QASM file.
-    circ = qtn.Circuit(N=60)
-    print("Loading circuit...")
-    circ = circ.from_openqasm2_file(
-        '/Users/mridul.sarkar/Documents/BlueQubitHackathon/circuit_3_60q.qasm'
-    )
-    print("Circuit loaded.\n")
-
-    # Setup the contraction optimizer using cotengra.
-    opt = ctg.ReusableHyperOptimizer(
-        parallel=True,
-        optlib="optuna",
-        max_time="rate:1e8",  # Limit optimization time.
-        directory=True,
-        progbar=True,
-    )
-
-    # Rehearse the sampling path (pre-optimizes contraction paths for each marginal).
-    print("Optimizing contraction path...")
-    rehs = circ.sample_gate_by_gate_rehearse(
-        group_size=10,
-        optimize=opt,
-        simplify_sequence="ADCRS"  # Use a simpler sequence to reduce overhead.
-    )
+    args = parse_args()
+    # Show the resource guard's re-planning decisions.
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    qasm_file = '/Users/mridul.sarkar/Documents/BlueQubitHackathon/circuit_3_60q.qasm'
+    output_file = "./tensor_networks/samples.bin"
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    sampler_path = os.path.join(args.checkpoint_dir, "sampler.pkl")
+    checkpoint_path = os.path.join(args.checkpoint_dir, "state.json")
+
+    # Number of samples pushed through the groups together per contraction.
+    sample_batch_size = 64
+
+    max_memory = None if args.max_memory_gb is None else int(args.max_memory_gb * 2**30)
+
+    if args.marginals:
+        # No sampling: contract each qubit's backward light cone once.
+        circ = CircuitCache().load_circuit(qasm_file, fusion=args.fuse)
+        p_one = qubit_marginals(circ, tree_store=TreeStore(), max_memory=max_memory)
+        bitstring, confidence = decode_marginals(p_one)
+        print(f"Decoded bitstring (rounded marginals):\n{bitstring}")
+        print(f"Lowest per-bit confidence: {confidence.min():.6f} (qubit {int(confidence.argmin())})")
+        return
+
+    state = None
+    if args.resume:
+        # Reload the rehearsed trees instead of loading and rehearsing again.
+        print(f"Resuming from {args.checkpoint_dir}...")
+        state = load_checkpoint(args, sampler_path, checkpoint_path, output_file)
+        sampler = PeakSampler.load(sampler_path)
+        # Drop samples written after the checkpoint so the log matches the counts.
+        truncate_sample_log(output_file, state["log_samples"])
+        print(f"Resumed at {state['num_samples']} samples.\n")
+    else:
+        # Setup the contraction optimizer using cotengra.
+        opt = ctg.ReusableHyperOptimizer(
+            parallel=True,
+            optlib="optuna",
+            max_time="rate:1e8",  # Limit optimization time.
+            progbar=True,
+        )
+
+        # Rehearse the sampling path once (pre-optimizes contraction paths for each
+        # marginal) and keep the simplified networks and trees in memory. The
+        # rehearsed sampler is cached per circuit and settings, so later runs
+        # load it instead of loading the circuit and rehearsing again.
+        print("Loading or rehearsing the sampler...")
+        sampler = CircuitCache().load_sampler(
+            qasm_file,
+            fusion=args.fuse,
+            group_size=10,
+            batch_size=sample_batch_size,
+            optimize=opt,
+            simplify_sequence="ADCRS",  # Use a simpler sequence to reduce overhead.
+            seed=args.seed,
+            tree_store=TreeStore(),  # Trees found by earlier runs are reused.
+            max_memory=max_memory,
+            memory_limit=None if args.memory_limit_gb is None else int(args.memory_limit_gb * 2**30),
+            precision=args.precision,
+        )
+        if args.precision == "single":
+            # Spot-check the single-precision marginals against double precision.
+            check = sampler.precision_check(seed=args.seed)
+            print(f"Max deviation from double precision: {check['max_deviation']:.3e}")
+        report = sampler.slicing_report()
+        print(f"Peak intermediate {report['peak_bytes'] / 2**30:.2f} GB, "
+              f"slices per group {report['nslices']}, flop overhead {report['overhead']:.2f}x.")
+        # Keep the rehearsal so an interrupted run can be resumed.
+        sampler.save(sampler_path)
+
+    if args.slice_workers > 1 and args.workers == 1:
+        # Spread the slices of each sliced marginal over the cores of the node.
+        sampler.executor = SlicedExecutor(args.slice_workers)
+        atexit.register(sampler.executor.close)
+
+    if args.beam > 0:
+        # Deterministic decode: keep the most probable prefixes group by group.
+        print(f"Beam search with width {args.beam}...")
+        for bitstring, probability in sampler.beam_search(args.beam):
+            print(f"{bitstring}  p = {probability:.6e}")
+        return
     
-    # Prepare to continuously sample and save each bitstring to a file.
-    output_file = "./tensor_networks/samples.txt"
-    # Open file in append mode (creates the file if it doesn't exist).
-    with open(output_file, "a") as f:
+    # Prepare to continuously sample and save each sample to a binary log
+    # (one uint64 per 60-qubit sample, see sample_log.py).
+    # Append to the log (creates it, with its header, if it doesn't exist).
+    # Samples are buffered and flushed by a background thread, followed by
+    # an atomic checkpoint of the counts and RNG state.
+    if args.workers > 1:
+        # Fork the rehearsed sampler into a pool of workers, each with its
+        # own child stream of SeedSequence(seed), merged in a fixed order.
+        # The pool keeps the merged per-bit counts itself. The workers are
+        # forked before the sink starts its background thread.
+        pool = SamplingPool(sampler, args.workers, seed=args.seed,
+                            state=state["pool"] if state else None)
+        votes = pool.votes
+        batches = iter(pool)
+    else:
+        pool = None
+        votes = VoteAccumulator(sampler.num_qubits)
+        batches = sampler.stream()
+        if state:
+            sampler.rng.bit_generator.state = state["rng_state"]
+
+    log = SampleLogWriter(output_file, sampler.num_qubits, circuit_hash=file_hash(qasm_file), seed=args.seed)
+    with BufferedSampleSink(log, flush_interval=args.flush_interval, checkpoint_path=checkpoint_path) as sink:
         print("Starting continuous sampling and appending to file...")
-        bitstring_counts = defaultdict(int)
-        rng = np.random.default_rng(42)
-        sample_batch_size = 1  # Number of samples per batch.
+        if state:
+            votes.restore(state["ones"], state["num_samples"])
+        progress = ProgressLine(interval=5.0)
+        cache_report = None
+        if pool is None:
+            # Workers keep their own caches; report the in-process one.
+            cache_report = lambda: "marginal cache hit rate {hit_rate:.1%} of samples, {prefix_hit_rate:.1%} of prefixes ({entries} entries, {nbytes} bytes)".format(
+                **sampler.cache_stats())
         
         # Continuous sampling loop.
-        while True:
-            for b in circ.sample_gate_by_gate(
-                sample_batch_size,
-                group_size=10,
-                optimize=opt,
-                simplify_sequence="ADCRS",
-                seed=rng
-            ):
-                # Update count (optional, for later analysis)
-                bitstring_counts[b] += 1
-                # Append the sampled bitstring to the file.
-                f.write(b + "\n")
-                f.flush()  # Flush to disk to ensure persistence on interruption.
-                print(b)
+        for batch in batches:
+            # Update per-bit counts (optional, for later analysis)
+            if pool is None:
+                votes.add(batch)
+            # Hand the batch and the state reached after it to the sink.
+            sink.put(batch, sampling_state(votes, rng=sampler.rng if pool is None else None, pool=pool))
+            progress.update(votes, extra=cache_report)
 
 if __name__ == '__main__':
     freeze_support()
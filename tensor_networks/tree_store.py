@@ -0,0 +1,175 @@
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+import cotengra as ctg
+
+from sample_sink import atomic_write_json
+
+# Shared by every script in the project unless PEAK_TREE_STORE points elsewhere.
+DEFAULT_DIRECTORY = os.environ.get(
+    "PEAK_TREE_STORE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".tree_store"),
+)
+
+
+def canonical_structure(inputs, output, size_dict):
+    """
+    Relabels the indices of a contraction by order of first appearance, so
+    that networks with the same index topology and sizes get the same
+    description whatever their index names or tensor values.
+
+    Returns:
+        tuple: (JSON-able structure, mapping from index name to label).
+    """
+    labels = {}
+    for term in list(inputs) + [output]:
+        for ix in term:
+            if ix not in labels:
+                labels[ix] = len(labels)
+    structure = {
+        "inputs": [[labels[ix] for ix in term] for term in inputs],
+        "output": [labels[ix] for ix in output],
+        "sizes": [int(size_dict[ix]) for ix in sorted(labels, key=labels.get)],
+    }
+    return structure, labels
+
+
+def hash_structure(structure):
+    """SHA-256 of a structure from `canonical_structure`."""
+    return hashlib.sha256(json.dumps(structure, separators=(",", ":")).encode()).hexdigest()
+
+
+def structure_key(inputs, output, size_dict):
+    """SHA-256 of the canonical structure of a contraction."""
+    structure, _ = canonical_structure(inputs, output, size_dict)
+    return hash_structure(structure)
+
+
+def tree_to_entry(tree, labels):
+    """
+    Describes a tree by its contraction path and sliced indices, with the
+    indices given by their canonical labels (see `canonical_structure`).
+    """
+    return {
+        "path": [list(pair) for pair in tree.get_path()],
+        "sliced": [labels[ix] for ix in tree.sliced_inds],
+    }
+
+
+def tree_from_entry(entry, inputs, output, size_dict, labels):
+    """
+    Rebuilds a tree from `tree_to_entry` for a contraction with the same
+    canonical structure, whatever its index names.
+    """
+    tree = ctg.ContractionTree.from_path(
+        inputs, output, size_dict, path=[tuple(pair) for pair in entry["path"]]
+    )
+    names = {label: ix for ix, label in labels.items()}
+    for label in entry["sliced"]:
+        tree.remove_ind_(names[label])
+    return tree
+
+
+def search_tree(inputs, output, size_dict, optimize="auto-hq"):
+    """Finds a contraction tree with a cotengra optimizer or preset."""
+    if hasattr(optimize, "search"):
+        return optimize.search(inputs, output, size_dict)
+    return ctg.array_contract_tree(inputs, output, size_dict=size_dict, optimize=optimize)
+
+
+class TreeStore:
+    """
+    Content-addressed on-disk store of contraction trees.
+
+    Trees are keyed by `structure_key`, i.e. by the index topology and sizes
+    of the (simplified) network but not its values, and stored as small JSON
+    files holding the contraction path and sliced indices. Writes go through
+    a temporary file and a rename, and writes and evictions hold an exclusive
+    lock on the store, so many processes can share it. Once the store grows
+    past `max_bytes`, the least recently used trees are evicted.
+
+    Args:
+        directory (str): Store location, shared project-wide by default.
+        max_bytes (int): Size cap of the store.
+        namespace (str): Optional tag mixed into every key, to keep trees
+            found by different optimizers apart.
+    """
+
+    def __init__(self, directory=None, max_bytes=1 << 30, namespace=""):
+        self.directory = directory or DEFAULT_DIRECTORY
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_path = os.path.join(self.directory, ".lock")
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _entry_path(self, structure):
+        if self.namespace:
+            structure = dict(structure, namespace=self.namespace)
+        return os.path.join(self.directory, f"{hash_structure(structure)}.json")
+
+    def get(self, inputs, output, size_dict):
+        """
+        Returns the stored tree for this contraction, or None.
+        """
+        structure, labels = canonical_structure(inputs, output, size_dict)
+        path = self._entry_path(structure)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            # Mark as recently used for the LRU eviction.
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return tree_from_entry(entry, inputs, output, size_dict, labels)
+
+    def put(self, inputs, output, size_dict, tree):
+        """
+        Stores a tree for this contraction, atomically.
+        """
+        structure, labels = canonical_structure(inputs, output, size_dict)
+        entry = tree_to_entry(tree, labels)
+        with self._locked():
+            atomic_write_json(self._entry_path(structure), entry)
+            self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until under the size cap."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or name.startswith("."):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def get_or_search(self, inputs, output, size_dict, optimize="auto-hq"):
+        """
+        Returns the stored tree, or searches for one and stores it.
+        """
+        tree = self.get(inputs, output, size_dict)
+        if tree is None:
+            tree = search_tree(inputs, output, size_dict, optimize)
+            self.put(inputs, output, size_dict, tree)
+        return tree